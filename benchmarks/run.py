@@ -0,0 +1,211 @@
+"""End-to-end ingest benchmark.
+
+Generates a synthetic vendor file, then times each stage of the pipeline
+against a local webhook stub and prints one JSON document:
+
+    python -m benchmarks.run --source transunion --rows 50000 > run.json
+    python -m benchmarks.run --source transunion --rows 50000 --compare run.json
+
+With --compare, the exit status is 1 if any stage's rows/s dropped by more
+than --tolerance against the earlier run. Timing DB logging needs the PG*
+environment variables to point at a database; pass --no-db to skip it.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from benchmarks.stub_server import start_stub
+from benchmarks.synthetic import write_csv
+
+class NullDatabase:
+    """Accepts the logging calls WebhookSender makes without storing them"""
+    def log_webhook_response(self, lead_id, payload, response_code, response_body, source_type=None):
+        pass
+
+    def flush(self):
+        return 0
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def _stage(rows, seconds, latencies):
+    latencies = np.asarray(latencies) * 1000
+    return {
+        'rows': rows,
+        'seconds': round(seconds, 4),
+        'rows_per_sec': round(rows / seconds, 1) if seconds else None,
+        'p50_ms': round(float(np.percentile(latencies, 50)), 3) if len(latencies) else None,
+        'p99_ms': round(float(np.percentile(latencies, 99)), 3) if len(latencies) else None,
+        'calls': len(latencies),
+        'peak_rss_mb': _peak_rss_mb()
+    }
+
+def _timed_calls(func, items):
+    latencies = []
+    results = []
+    started = time.perf_counter()
+    for item in items:
+        call_started = time.perf_counter()
+        results.append(func(item))
+        latencies.append(time.perf_counter() - call_started)
+    return results, time.perf_counter() - started, latencies
+
+def run(args):
+    from models.lead_processor import LeadProcessor, memory_per_row
+    from models.rate_control import RateController
+    from models.webhook import WebhookSender, WebhookError
+
+    class TimedSender(WebhookSender):
+        """Records the wall time of every send, retries included"""
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.latencies = []
+
+        def send(self, lead_data, source_type=None):
+            started = time.perf_counter()
+            try:
+                return super().send(lead_data, source_type)
+            finally:
+                self.latencies.append(time.perf_counter() - started)
+
+    stages = {}
+    processor = LeadProcessor()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_csv(args.source, args.rows, os.path.join(tmp, f'{args.source}.csv'),
+                         args.extra_columns, args.seed)
+
+        parsed_runs, seconds, latencies = _timed_calls(
+            lambda _: processor.process_file(path, args.source), range(args.repeat))
+        stages['process_file'] = _stage(args.rows * args.repeat, seconds, latencies)
+        parsed = parsed_runs[-1]
+
+    normalized_runs, seconds, latencies = _timed_calls(
+        lambda _: processor.normalize_data(parsed.copy()), range(args.repeat))
+    stages['normalize_data'] = _stage(args.rows * args.repeat, seconds, latencies)
+    normalized = normalized_runs[-1]
+
+    compact_processor = LeadProcessor(compact=True)
+    compact_runs, seconds, latencies = _timed_calls(
+        lambda _: compact_processor.normalize_data(parsed.copy()), range(args.repeat))
+    stages['normalize_data_compact'] = _stage(args.rows * args.repeat, seconds, latencies)
+    memory = {'default': memory_per_row(normalized), 'compact': memory_per_row(compact_runs[-1])}
+
+    sample = normalized.head(args.send_rows)
+    records = sample.to_dict('records')
+    # Only prepare_payload is used; no request is sent
+    sender = WebhookSender(NullDatabase(), webhook_url='http://127.0.0.1/unused')
+    valid = []
+    def prepare(lead):
+        try:
+            sender.prepare_payload(lead)
+            valid.append(lead)
+        except WebhookError:
+            pass
+    _, seconds, latencies = _timed_calls(prepare, records)
+    stages['prepare_payload'] = _stage(len(records), seconds, latencies)
+
+    started = time.perf_counter()
+    sender.prepare_payloads(sample)
+    stages['prepare_payloads'] = _stage(len(sample), time.perf_counter() - started, [])
+
+    server, url, stub = start_stub(
+        latency=args.stub_latency, error_rate=args.stub_error_rate, rate_limit=args.stub_rate_limit)
+    try:
+        rate_controller = RateController(rate=args.send_rate) if args.send_rate else None
+        sender = TimedSender(NullDatabase(), webhook_url=url, max_retries=args.max_retries,
+                             rate_controller=rate_controller)
+        started = time.perf_counter()
+        results = sender.send_many(valid, args.concurrency)
+        seconds = time.perf_counter() - started
+        stages['send'] = _stage(len(valid), seconds, sender.latencies)
+        stages['send']['delivered'] = sum(result is True for result in results)
+        stages['send']['stub_responses'] = {str(code): count for code, count in sorted(stub.counts.items())}
+    finally:
+        server.shutdown()
+
+    if not args.no_db:
+        from models.database import Database
+        payload = json.dumps(sender.prepare_payload(valid[0])) if valid else '{}'
+        for label, buffer_size in (('log_webhook_response', 0), ('log_webhook_response_buffered', 500)):
+            db = Database(buffer_size=buffer_size)
+            _, seconds, latencies = _timed_calls(
+                lambda i: db.log_webhook_response(f'bench-{i}', payload, 200, '{"status": "success"}'),
+                range(args.db_rows))
+            started = time.perf_counter()
+            db.close()
+            seconds += time.perf_counter() - started
+            stages[label] = _stage(args.db_rows, seconds, latencies)
+
+    return {
+        'meta': {
+            'source': args.source,
+            'rows': args.rows,
+            'extra_columns': args.extra_columns,
+            'concurrency': args.concurrency,
+            'stub_latency': args.stub_latency,
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+        },
+        'stages': stages,
+        'memory_bytes_per_row': memory
+    }
+
+def compare(current, baseline, tolerance):
+    """List stages whose throughput fell by more than tolerance (a fraction)"""
+    regressions = []
+    for name, stage in current['stages'].items():
+        before = baseline.get('stages', {}).get(name, {}).get('rows_per_sec')
+        after = stage.get('rows_per_sec')
+        if before and after and after < before * (1 - tolerance):
+            regressions.append({'stage': name, 'baseline_rows_per_sec': before, 'rows_per_sec': after})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', choices=['experian', 'transunion', 'leadsource'], default='transunion')
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--extra-columns', type=int, default=0, help='unused columns to widen the file')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of the file-level stages')
+    parser.add_argument('--send-rows', type=int, default=2000, help='leads sent to the stub')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--max-retries', type=int, default=3)
+    parser.add_argument('--send-rate', type=float, default=None,
+                        help='starting requests/second for the rate controller')
+    parser.add_argument('--stub-latency', type=float, default=0.02)
+    parser.add_argument('--stub-error-rate', type=float, default=0.0)
+    parser.add_argument('--stub-rate-limit', type=int, default=None)
+    parser.add_argument('--db-rows', type=int, default=2000, help='rows written per DB logging mode')
+    parser.add_argument('--no-db', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON here instead of stdout')
+    parser.add_argument('--compare', help='earlier JSON output to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    report = run(args)
+    status = 0
+    if args.compare:
+        with open(args.compare) as f:
+            report['regressions'] = compare(report, json.load(f), args.tolerance)
+        status = 1 if report['regressions'] else 0
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    sys.exit(status)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Local stand-in for the Bonzo webhook with configurable latency, errors and throttling."""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class StubState:
+    def __init__(self, latency=0.05, jitter=0.0, error_rate=0.0, rate_limit=None, retry_after=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.counts = {}
+        self._window = None
+        self._window_count = 0
+        self._lock = threading.Lock()
+
+    def status(self):
+        """Pick the response code for the next request"""
+        with self._lock:
+            if self.rate_limit:
+                now = int(time.monotonic())
+                if now != self._window:
+                    self._window, self._window_count = now, 0
+                self._window_count += 1
+                if self._window_count > self.rate_limit:
+                    return self._count(429)
+            if random.random() < self.error_rate:
+                return self._count(random.choice([500, 502, 503]))
+            return self._count(200)
+
+    def _count(self, code):
+        self.counts[code] = self.counts.get(code, 0) + 1
+        return code
+
+def _handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            time.sleep(max(0.0, state.latency + random.uniform(-state.jitter, state.jitter)))
+            code = state.status()
+            body = json.dumps({'status': 'success' if code == 200 else 'error'}).encode()
+            self.send_response(code)
+            if code == 429:
+                self.send_header('Retry-After', str(state.retry_after))
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+    return Handler
+
+def start_stub(port=0, **options):
+    """Start the stub in a background thread; returns (server, url, state)"""
+    state = StubState(**options)
+    server = ThreadingHTTPServer(('127.0.0.1', port), _handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/webhook', state
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per request')
+    parser.add_argument('--jitter', type=float, default=0.0, help='+/- seconds of random latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of 5xx responses')
+    parser.add_argument('--rate-limit', type=int, default=None, help='requests/second before 429s')
+    parser.add_argument('--retry-after', type=int, default=1)
+    args = parser.parse_args()
+    server, url, _ = start_stub(
+        args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        rate_limit=args.rate_limit, retry_after=args.retry_after
+    )
+    print(f'Stub webhook listening on {url}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Synthetic vendor files with the real column names of each source schema."""
+import random
+import string
+import numpy as np
+import pandas as pd
+from utils.source_schemas import get_schema
+
+FIRST_NAMES = ['james', 'mary', 'robert', 'patricia', 'john', 'jennifer', 'michael', 'linda']
+LAST_NAMES = ['smith', 'johnson', 'williams', 'brown', 'jones', 'garcia', 'miller', 'davis']
+CITIES = ['austin', 'denver', 'phoenix', 'tampa', 'boise', 'raleigh', 'omaha', 'reno']
+STATES = ['tx', 'co', 'az', 'fl', 'id', 'nc', 'ne', 'nv']
+STREETS = ['main st', 'oak ave', 'pine rd', 'maple dr', 'cedar ln', 'elm ct']
+LOAN_TYPES = ['conventional', 'fha', 'va', 'usda']
+YES_NO = ['Yes', 'No', '']
+
+def _phones(rng, rows, missing=0.1):
+    numbers = rng.integers(2012000000, 9899999999, rows).astype(str).astype(object)
+    formatted = np.where(rng.random(rows) < 0.5, numbers,
+                         ['(%s) %s-%s' % (n[:3], n[3:6], n[6:]) for n in numbers])
+    return np.where(rng.random(rows) < missing, '', formatted)
+
+def _column(name, rng, rows):
+    """Plausible values for a vendor column, chosen from its name"""
+    lowered = name.lower()
+    if 'phone' in lowered or 'telephone' in lowered:
+        return _phones(rng, rows)
+    if lowered in ('first name', 'first_name'):
+        return rng.choice(FIRST_NAMES, rows)
+    if lowered in ('surname', 'last name', 'last_name'):
+        return rng.choice(LAST_NAMES, rows)
+    if 'house number' in lowered:
+        return rng.integers(1, 9999, rows)
+    if lowered in ('address', 'street name/apartment'):
+        return rng.choice(STREETS, rows)
+    if lowered == 'city':
+        return rng.choice(CITIES, rows)
+    if lowered == 'state':
+        return rng.choice(STATES, rows)
+    if 'zip' in lowered:
+        return np.char.zfill(rng.integers(501, 99950, rows).astype(str), 5)
+    if lowered == 'email':
+        return [f'lead{i}@example.com' for i in rng.integers(0, rows * 10, rows)]
+    if 'score' in lowered or 'credit' in lowered:
+        return rng.integers(520, 840, rows)
+    if 'rate' in lowered or lowered.endswith('_int'):
+        return np.round(rng.uniform(2.5, 8.5, rows), 3)
+    if lowered in ('ltv',):
+        return np.round(rng.uniform(40, 97, rows), 1)
+    if 'date' in lowered:
+        return pd.date_range('2020-01-01', periods=rows, freq='h').strftime('%Y-%m-%d')
+    if lowered in ('cash out', 'found home', 'va eligible', 'mtg_two'):
+        return rng.choice(YES_NO, rows)
+    if 'loan type' in lowered:
+        return rng.choice(LOAN_TYPES, rows)
+    if 'id' in lowered:
+        return [f'ID{i:09d}' for i in range(rows)]
+    if any(word in lowered for word in ('balance', 'value', 'bal_', 'cash', 'pmt', 'payment', 'loan_val')):
+        return rng.integers(20000, 900000, rows)
+    return [''.join(random.choices(string.ascii_lowercase, k=8)) for _ in range(rows)]
+
+def generate(source_type, rows, extra_columns=0, seed=0):
+    """DataFrame shaped like a vendor file for source_type.
+
+    extra_columns adds unused numeric columns to mimic wide vendor drops.
+    """
+    rng = np.random.default_rng(seed)
+    random.seed(seed)
+    data = {}
+    for name in get_schema(source_type).columns:
+        # Experian repeats its phone headers; the .1 copies are pandas' names for them
+        header = name[:-2] if name.endswith('.1') else name
+        data[name] = (header, _column(name, rng, rows))
+    for i in range(extra_columns):
+        data[f'extra_{i}'] = (f'Unused Attribute {i}', rng.random(rows))
+    frame = pd.DataFrame({key: values for key, (_, values) in data.items()})
+    frame.columns = [header for header, _ in data.values()]
+    return frame
+
+def write_csv(source_type, rows, path, extra_columns=0, seed=0):
+    generate(source_type, rows, extra_columns, seed).to_csv(path, index=False)
+    return path
@@ -1,16 +1,36 @@
 import os
+import tempfile
 
-# Database configuration
-DB_CONFIG = {
-    "host": os.environ["PGHOST"],
-    "database": os.environ["PGDATABASE"],
-    "user": os.environ["PGUSER"],
-    "password": os.environ["PGPASSWORD"],
-    "port": os.environ["PGPORT"],
+# Settings read from the environment on first access rather than at import,
+# so importing a module that needs one of them stays cheap
+def _db_config():
+    # Database configuration
+    return {
+        "host": os.environ["PGHOST"],
+        "database": os.environ["PGDATABASE"],
+        "user": os.environ["PGUSER"],
+        "password": os.environ["PGPASSWORD"],
+        "port": os.environ["PGPORT"],
+    }
+
+_LAZY_SETTINGS = {
+    "DB_CONFIG": _db_config,
+    # Bonzo webhook configuration
+    "BONZO_WEBHOOK_URL": lambda: os.environ["CLIENT_SECRET_WEBHOOK_URL"],
+    # Parquet staging cache for normalized files (see models/staging.py)
+    "STAGING_DIR": lambda: os.environ.get("LEAD_STAGING_DIR", os.path.join(tempfile.gettempdir(), "lead_staging")),
+    "STAGING_MAX_BYTES": lambda: int(os.environ.get("LEAD_STAGING_MAX_BYTES", 2 * 1024 ** 3)),
+    # Webhook send rate cap and starting rate in requests/second; sends run
+    # at the cap until Bonzo pushes back (see models/rate_control.py)
+    "WEBHOOK_MAX_RATE": lambda: float(os.environ.get("WEBHOOK_MAX_RATE", 1000)),
+    "WEBHOOK_START_RATE": lambda: float(os.environ["WEBHOOK_START_RATE"]) if os.environ.get("WEBHOOK_START_RATE") else None,
 }
 
-# Bonzo webhook configuration
-BONZO_WEBHOOK_URL = os.environ["CLIENT_SECRET_WEBHOOK_URL"]
+def __getattr__(name):
+    if name not in _LAZY_SETTINGS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = globals()[name] = _LAZY_SETTINGS[name]()
+    return value
 
 # Field mappings for normalization
 NORMALIZED_FIELDS = [
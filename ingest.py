@@ -0,0 +1,115 @@
+"""Headless ingest of one vendor file, without the dashboard stack.
+
+    python ingest.py leads.csv --source transunion
+    python ingest.py leads.csv --source experian --enqueue --validate --dedup --skip-seen
+
+Sends leads straight to the webhook, or with --enqueue writes them to the
+lead_outbox table for OutboxWorker to deliver. Either way one row is added
+to processing_logs, counting every row read from the file as processed and
+rows rejected by --validate as failures (rows dropped by --dedup or
+--skip-seen count as neither); the stage timings are added to stage_timings and a JSON
+summary is printed; --metrics-port also serves the timings for scraping
+while the ingest runs. Only the modules the chosen options need are
+imported; streamlit and plotly never are.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+def ingest(args):
+    from models.database import Database
+    from models.fingerprint import hash_file
+    from models.lead_processor import LeadProcessor
+    from models.metrics import metrics
+
+    db = Database(buffer_size=args.buffer_size)
+    processor = LeadProcessor(compact=args.compact)
+    file_name = os.path.basename(args.file)
+    file_hash = hash_file(args.file)
+
+    fingerprints = None
+    if args.skip_seen:
+        from models.fingerprint import IngestFingerprints
+        fingerprints = IngestFingerprints(db)
+        earlier = fingerprints.seen_file(file_hash)
+        if earlier is not None:
+            return {'file': file_name, 'skipped': True, 'ingested_at': str(earlier[2])}
+
+    stats = {}
+    options = {
+        'chunksize': args.chunksize,
+        'processes': args.processes,
+        'fingerprints': fingerprints,
+        'file_hash': file_hash,
+        'stats': stats
+    }
+    if args.validate:
+        from models.validation import LeadValidator
+        options['validator'] = LeadValidator(db)
+    if args.dedup:
+        from models.dedup import LeadDeduplicator
+        options['deduplicator'] = LeadDeduplicator(db)
+    if args.stage:
+        from models.staging import StagingCache
+        options['staging'] = StagingCache()
+
+    if args.enqueue:
+        success_count = processor.enqueue_file(args.file, args.source, db, file_name, **options)
+        failure_count = 0
+    else:
+        from models.webhook import WebhookSender
+        sender = WebhookSender(db)
+        success_count = failure_count = 0
+        for _, result in processor.stream_file(args.file, args.source, sender,
+                                               concurrency=args.concurrency, **options):
+            if result is True:
+                success_count += 1
+            else:
+                failure_count += 1
+
+    rejected_count = stats.get('records_rejected', 0)
+    failure_count += rejected_count
+    db.log_processing(args.source, file_name, stats.get('records_read', 0),
+                      success_count, failure_count, file_hash)
+    metrics.write_to(db)
+    db.close()
+    return {
+        'file': file_name,
+        'skipped': False,
+        'mode': 'enqueue' if args.enqueue else 'send',
+        'records_read': stats.get('records_read', 0),
+        'success_count': success_count,
+        'failure_count': failure_count,
+        'rejected_count': rejected_count
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('file')
+    parser.add_argument('--source', required=True, help='registered source type, e.g. transunion')
+    parser.add_argument('--enqueue', action='store_true', help='queue leads in lead_outbox instead of sending')
+    parser.add_argument('--validate', action='store_true', help='reject rows failing the processing rules')
+    parser.add_argument('--dedup', action='store_true', help='drop leads already seen from any source')
+    parser.add_argument('--skip-seen', action='store_true', help='skip files and rows ingested before')
+    parser.add_argument('--stage', action='store_true', help='read/write the Parquet staging cache')
+    parser.add_argument('--compact', action='store_true', help='normalize into compact dtypes')
+    parser.add_argument('--chunksize', type=int, default=5000)
+    parser.add_argument('--processes', type=int, default=None, help='parse and normalize in N processes')
+    parser.add_argument('--concurrency', type=int, default=8, help='parallel webhook requests')
+    parser.add_argument('--buffer-size', type=int, default=500, help='webhook responses per DB insert')
+    parser.add_argument('--metrics-port', type=int, default=None, help='serve stage metrics at :PORT/metrics')
+    args = parser.parse_args()
+
+    if args.metrics_port is not None:
+        from models.metrics import serve_metrics
+        serve_metrics(args.metrics_port)
+
+    started = time.perf_counter()
+    summary = ingest(args)
+    summary['seconds'] = round(time.perf_counter() - started, 3)
+    print(json.dumps(summary))
+
+if __name__ == '__main__':
+    sys.exit(main())
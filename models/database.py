@@ -1,14 +1,174 @@
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
 import psycopg2
-from psycopg2.extras import DictCursor
-from config import DB_CONFIG
+from psycopg2.extras import DictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
+import config
+from models.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# Default bounds for the per-process connection pool
+DEFAULT_MIN_CONNECTIONS = 1
+DEFAULT_MAX_CONNECTIONS = 20
+
+# webhook_responses is partitioned by month of sent_at; partitions are
+# created this many months ahead and kept this many months back
+WEBHOOK_PARTITION_MONTHS_AHEAD = 3
+WEBHOOK_RETENTION_MONTHS = 6
+_PARTITION_NAME = re.compile(r'^webhook_responses_p(\d{4})_(\d{2})$')
+
+# pg_advisory_xact_lock key serializing schema changes across processes
+SCHEMA_LOCK_KEY = 7_318_242_001
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+class ConnectionPool:
+    """Thread-safe psycopg2 pool whose checkout waits for a free connection.
+
+    ThreadedConnectionPool raises as soon as every connection is in use;
+    the semaphore makes callers queue instead.
+    """
+
+    def __init__(self, minconn=DEFAULT_MIN_CONNECTIONS, maxconn=DEFAULT_MAX_CONNECTIONS):
+        self._pool = ThreadedConnectionPool(minconn, maxconn, **config.DB_CONFIG)
+        self._available = threading.BoundedSemaphore(maxconn)
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection, committing on success and rolling back on error"""
+        self._available.acquire()
+        try:
+            conn = self._pool.getconn()
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                self._pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            self._available.release()
+
+    def close(self):
+        self._pool.closeall()
+
+def get_pool(minconn=DEFAULT_MIN_CONNECTIONS, maxconn=DEFAULT_MAX_CONNECTIONS):
+    """Return the process-wide pool, creating it with the given bounds on first use"""
+    global _pool, _pool_pid
+    with _pool_lock:
+        # A forked child must not reuse the parent's sockets
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ConnectionPool(minconn, maxconn)
+            _pool_pid = os.getpid()
+        return _pool
+
+def close_pool():
+    """Close every pooled connection, e.g. at process shutdown"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+def migrate():
+    """Create or update the schema; safe to run on every deploy.
+
+    Unlike the implicit setup on first use, this also converts an
+    unpartitioned webhook_responses table, which locks it while every row
+    is copied; run it in a deploy step, not from a serving process.
+    """
+    global _schema_ready
+    with _schema_lock:
+        Database(auto_migrate=False).create_tables(convert_webhook_responses=True)
+        _schema_ready = True
+
+def _ensure_schema():
+    """Run migrate() unless this process already has"""
+    global _schema_ready
+    with _schema_lock:
+        if not _schema_ready:
+            Database(auto_migrate=False).create_tables()
+            _schema_ready = True
+
+def run_retention(keep_months=WEBHOOK_RETENTION_MONTHS):
+    """Daily maintenance: add upcoming partitions and drop expired ones"""
+    db = Database()
+    db.ensure_webhook_partitions()
+    return db.drop_webhook_partitions(keep_months)
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
 
 class Database:
-    def __init__(self):
-        self.conn = psycopg2.connect(**DB_CONFIG)
-        self.create_tables()
+    def __init__(self, buffer_size=0, flush_interval=5.0, auto_migrate=True,
+                 min_connections=DEFAULT_MIN_CONNECTIONS, max_connections=DEFAULT_MAX_CONNECTIONS):
+        """Attach to the shared connection pool.
+
+        Nothing connects until the first query: the pool is opened and,
+        unless auto_migrate is False (run migrate() at deploy time instead),
+        the schema created on first use in each process. The pool bounds
+        only apply to the first Database that connects.
+
+        With buffer_size > 0, webhook responses are collected in memory and
+        written in one multi-row insert once buffer_size rows are waiting or
+        flush_interval seconds have passed since the last flush. Either way
+        their webhook_rollup_hourly counts are added up in memory and
+        upserted on the same schedule, so concurrent senders do not queue
+        on the row lock of the current hour.
+        """
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.auto_migrate = auto_migrate
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._webhook_buffer = []
+        # (source_type, response_code) -> responses not yet in webhook_rollup_hourly
+        self._rollup_counts = {}
+        self._last_flush = time.monotonic()
+        self._buffer_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def pool(self):
+        return get_pool(self.min_connections, self.max_connections)
+
+    def connection(self):
+        """Context-managed connection checked out from the shared pool"""
+        if self.auto_migrate and not _schema_ready:
+            _ensure_schema()
+        return self.pool.connection()
+
+    def create_tables(self, convert_webhook_responses=False):
+        """Create missing tables, views and partitions.
 
-    def create_tables(self):
-        with self.conn.cursor() as cur:
+        An unpartitioned webhook_responses table is only converted with
+        convert_webhook_responses (see migrate()); otherwise it is left as
+        is and a warning is logged.
+        """
+        with self.connection() as conn, conn.cursor() as cur:
+            # Workers starting together would otherwise race on the same DDL
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (SCHEMA_LOCK_KEY,))
+            cur.execute("SELECT to_regclass('processing_rollup_daily') IS NULL")
+            new_rollups = cur.fetchone()[0]
+            
             # Create processing_logs table
             cur.execute("""
                 CREATE TABLE IF NOT EXISTS processing_logs (
@@ -21,36 +181,632 @@ class Database:
                     processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
+            cur.execute("ALTER TABLE processing_logs ADD COLUMN IF NOT EXISTS file_hash BYTEA")
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_processing_logs_file_hash
+                ON processing_logs (file_hash)
+            """)
             
-            # Create webhook_responses table
+            # Create ingested_files / ingested_rows tables fingerprinting what was already ingested
             cur.execute("""
-                CREATE TABLE IF NOT EXISTS webhook_responses (
-                    id SERIAL PRIMARY KEY,
+                CREATE TABLE IF NOT EXISTS ingested_files (
+                    file_hash BYTEA PRIMARY KEY,
+                    source_type VARCHAR(50),
+                    file_name VARCHAR(255),
+                    records_read INTEGER,
+                    records_new INTEGER,
+                    ingested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS ingested_rows (
+                    row_hash BIGINT PRIMARY KEY,
+                    source_type VARCHAR(50),
+                    first_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
+            # Create webhook_payloads table storing each distinct payload once
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS webhook_payloads (
+                    payload_hash BYTEA PRIMARY KEY,
+                    payload JSONB NOT NULL,
+                    first_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
+            # Create webhook_responses table, range-partitioned by month
+            cur.execute("""
+                SELECT c.relkind FROM pg_class c
+                WHERE c.oid = to_regclass('webhook_responses')
+            """)
+            existing = cur.fetchone()
+            unpartitioned = existing is not None and existing[0] != 'p'
+            if existing is not None and not self._has_column(cur, 'webhook_responses', 'source_type'):
+                cur.execute("ALTER TABLE webhook_responses ADD COLUMN source_type VARCHAR(50)")
+            if unpartitioned and not convert_webhook_responses:
+                logger.warning("webhook_responses is not partitioned yet; run models.database.migrate() "
+                               "from a deploy step to convert it")
+            else:
+                self._create_webhook_responses(cur, unpartitioned)
+
+            # Create lead_outbox table holding normalized leads until delivered
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS lead_outbox (
+                    id BIGSERIAL PRIMARY KEY,
+                    source_type VARCHAR(50),
+                    file_name VARCHAR(255),
                     lead_id VARCHAR(255),
-                    payload JSONB,
+                    lead JSONB NOT NULL,
+                    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    claimed_at TIMESTAMP,
+                    lease_expires_at TIMESTAMP,
+                    sent_at TIMESTAMP
+                )
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_lead_outbox_open
+                ON lead_outbox (id) WHERE status IN ('pending', 'in_flight')
+            """)
+            
+            # Create lead_match_keys table indexing every phone/email/address seen
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS lead_match_keys (
+                    key_hash BIGINT PRIMARY KEY,
+                    source_type VARCHAR(50),
+                    first_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
+            # Create rejected_leads table for rows failing validation
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS rejected_leads (
+                    id BIGSERIAL PRIMARY KEY,
+                    source_type VARCHAR(50),
+                    file_name VARCHAR(255),
+                    lead_id VARCHAR(255),
+                    reasons TEXT,
+                    lead JSONB,
+                    rejected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
+            # Create stage_timings table for periodic metrics snapshots
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS stage_timings (
+                    id BIGSERIAL PRIMARY KEY,
+                    stage VARCHAR(100),
+                    calls BIGINT,
+                    rows_processed BIGINT,
+                    total_seconds DOUBLE PRECISION,
+                    p50_seconds DOUBLE PRECISION,
+                    p99_seconds DOUBLE PRECISION,
+                    max_seconds DOUBLE PRECISION,
+                    recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_stage_timings_recorded_at
+                ON stage_timings (recorded_at)
+            """)
+            
+            # Create rollup tables kept up to date by the log_* methods
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS processing_rollup_daily (
+                    bucket DATE,
+                    source_type VARCHAR(50),
+                    file_count BIGINT NOT NULL DEFAULT 0,
+                    records_processed BIGINT NOT NULL DEFAULT 0,
+                    success_count BIGINT NOT NULL DEFAULT 0,
+                    failure_count BIGINT NOT NULL DEFAULT 0,
+                    PRIMARY KEY (bucket, source_type)
+                )
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS webhook_rollup_hourly (
+                    bucket TIMESTAMP,
+                    source_type VARCHAR(50) NOT NULL DEFAULT '',
                     response_code INTEGER,
-                    response_body TEXT,
-                    sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    request_count BIGINT NOT NULL DEFAULT 0,
+                    PRIMARY KEY (bucket, source_type, response_code)
                 )
             """)
-            self.conn.commit()
+            if not self._has_column(cur, 'webhook_rollup_hourly', 'source_type'):
+                # Hours counted before the source was tracked keep source_type ''
+                cur.execute("""
+                    ALTER TABLE webhook_rollup_hourly
+                    ADD COLUMN source_type VARCHAR(50) NOT NULL DEFAULT '',
+                    DROP CONSTRAINT webhook_rollup_hourly_pkey,
+                    ADD PRIMARY KEY (bucket, source_type, response_code)
+                """)
+            if new_rollups:
+                self._backfill_rollups(cur)
+
+    def _has_column(self, cur, table, column):
+        cur.execute("""
+            SELECT EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_schema = current_schema() AND table_name = %s AND column_name = %s
+            )
+        """, (table, column))
+        return cur.fetchone()[0]
+
+    def _create_webhook_responses(self, cur, unpartitioned=False):
+        """Create webhook_responses range-partitioned by month, converting an unpartitioned one"""
+        if unpartitioned:
+            self._set_aside_unpartitioned_responses(cur)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS webhook_responses (
+                id BIGSERIAL,
+                lead_id VARCHAR(255),
+                payload_hash BYTEA,
+                response_code INTEGER,
+                response_body TEXT,
+                sent_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                source_type VARCHAR(50),
+                PRIMARY KEY (id, sent_at)
+            ) PARTITION BY RANGE (sent_at)
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS webhook_responses_default
+            PARTITION OF webhook_responses DEFAULT
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_webhook_responses_sent_at
+            ON webhook_responses (sent_at)
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_webhook_responses_lead_id
+            ON webhook_responses (lead_id)
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_webhook_responses_payload_hash
+            ON webhook_responses (payload_hash)
+        """)
+        self._create_webhook_partitions(cur)
+        if unpartitioned:
+            self._copy_unpartitioned_responses(cur)
+        cur.execute("""
+            CREATE OR REPLACE VIEW webhook_response_payloads AS
+            SELECT r.id, r.lead_id, p.payload, r.response_code, r.response_body, r.sent_at
+            FROM webhook_responses r
+            LEFT JOIN webhook_payloads p ON p.payload_hash = r.payload_hash
+        """)
+
+    def _create_webhook_partitions(self, cur, first_month=None,
+                                   months_ahead=WEBHOOK_PARTITION_MONTHS_AHEAD):
+        """Create monthly partitions from first_month (default: this month) to months_ahead.
+
+        Rows that fell into the default partition for a month without one
+        are moved into the new partition as it is attached; otherwise
+        Postgres refuses to create it.
+        """
+        cur.execute("SELECT DATE_TRUNC('month', CURRENT_TIMESTAMP)::date")
+        this_month = cur.fetchone()[0]
+        month = first_month or this_month
+        last_month = _add_months(this_month, months_ahead)
+        while month <= last_month:
+            name = f'webhook_responses_p{month:%Y_%m}'
+            bounds = (month, _add_months(month, 1))
+            month = bounds[1]
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL", (name,))
+            if cur.fetchone()[0]:
+                continue
+            # Keep new rows out of the default partition until the month is attached
+            cur.execute("LOCK TABLE webhook_responses_default IN EXCLUSIVE MODE")
+            cur.execute("""
+                SELECT EXISTS (
+                    SELECT 1 FROM webhook_responses_default WHERE sent_at >= %s AND sent_at < %s
+                )
+            """, bounds)
+            if not cur.fetchone()[0]:
+                cur.execute(f"""
+                    CREATE TABLE {name}
+                    PARTITION OF webhook_responses
+                    FOR VALUES FROM (%s) TO (%s)
+                """, bounds)
+                continue
+            cur.execute(f"CREATE TABLE {name} (LIKE webhook_responses INCLUDING DEFAULTS)")
+            cur.execute(f"""
+                WITH moved AS (
+                    DELETE FROM webhook_responses_default
+                    WHERE sent_at >= %s AND sent_at < %s
+                    RETURNING id, lead_id, payload_hash, response_code, response_body, sent_at, source_type
+                )
+                INSERT INTO {name}
+                (id, lead_id, payload_hash, response_code, response_body, sent_at, source_type)
+                SELECT * FROM moved
+            """, bounds)
+            cur.execute(f"""
+                ALTER TABLE webhook_responses ATTACH PARTITION {name}
+                FOR VALUES FROM (%s) TO (%s)
+            """, bounds)
+
+    def _set_aside_unpartitioned_responses(self, cur):
+        """Rename the pre-partitioning table and its indexes out of the way"""
+        cur.execute("ALTER TABLE webhook_responses RENAME TO webhook_responses_unpartitioned")
+        cur.execute("""
+            SELECT indexname FROM pg_indexes WHERE tablename = 'webhook_responses_unpartitioned'
+        """)
+        for (name,) in cur.fetchall():
+            cur.execute(f'ALTER INDEX "{name}" RENAME TO "{name[:50]}_unpartitioned"')
+
+    def _copy_unpartitioned_responses(self, cur):
+        """Move rows from the pre-partitioning table, storing each payload once"""
+        cur.execute("""
+            SELECT DATE_TRUNC('month', MIN(sent_at))::date FROM webhook_responses_unpartitioned
+        """)
+        first_month = cur.fetchone()[0]
+        if first_month is not None:
+            self._create_webhook_partitions(cur, first_month)
+        cur.execute("""
+            INSERT INTO webhook_payloads (payload_hash, payload)
+            SELECT DISTINCT ON (1) sha256(convert_to(payload::text, 'UTF8')), payload
+            FROM webhook_responses_unpartitioned
+            WHERE payload IS NOT NULL
+            ON CONFLICT (payload_hash) DO NOTHING
+        """)
+        cur.execute("""
+            INSERT INTO webhook_responses
+            (id, lead_id, payload_hash, response_code, response_body, sent_at, source_type)
+            SELECT id, lead_id, sha256(convert_to(payload::text, 'UTF8')),
+                   response_code, response_body, COALESCE(sent_at, CURRENT_TIMESTAMP), source_type
+            FROM webhook_responses_unpartitioned
+        """)
+        cur.execute("""
+            SELECT setval(pg_get_serial_sequence('webhook_responses', 'id'),
+                          GREATEST((SELECT MAX(id) FROM webhook_responses), 1))
+        """)
+        cur.execute("DROP TABLE webhook_responses_unpartitioned")
+
+    def ensure_webhook_partitions(self, months_ahead=WEBHOOK_PARTITION_MONTHS_AHEAD):
+        """Create any missing partitions up to months_ahead months from now"""
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (SCHEMA_LOCK_KEY,))
+            self._create_webhook_partitions(cur, months_ahead=months_ahead)
+
+    def drop_webhook_partitions(self, keep_months=WEBHOOK_RETENTION_MONTHS):
+        """Drop webhook_responses months older than keep_months, then unreferenced payloads.
+
+        The rollup tables are left alone, so dashboards keep their history.
+        Returns the names of the dropped partitions.
+        """
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT DATE_TRUNC('month', CURRENT_TIMESTAMP)::date")
+            cutoff = _add_months(cur.fetchone()[0], -keep_months)
+            cur.execute("""
+                SELECT c.relname FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'webhook_responses'::regclass
+            """)
+            dropped = []
+            for (name,) in cur.fetchall():
+                match = _PARTITION_NAME.match(name)
+                if match and date(int(match.group(1)), int(match.group(2)), 1) < cutoff:
+                    cur.execute(f"DROP TABLE {name}")
+                    dropped.append(name)
+            cur.execute("DELETE FROM webhook_responses_default WHERE sent_at < %s", (cutoff,))
+            cur.execute("""
+                DELETE FROM webhook_payloads p
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM webhook_responses r WHERE r.payload_hash = p.payload_hash
+                )
+            """)
+        return sorted(dropped)
+
+    def _insert_webhook_responses(self, cur, rows):
+        """Insert (lead_id, payload, response_code, response_body, source_type) rows.
+
+        Payloads are keyed by the SHA-256 of their canonical JSONB text and
+        stored in webhook_payloads once; each response row only keeps the hash.
+        """
+        execute_values(cur, """
+            WITH batch (lead_id, payload, response_code, response_body, source_type) AS (VALUES %s),
+            hashed AS (
+                SELECT lead_id, payload, response_code, response_body, source_type,
+                       sha256(convert_to(payload::text, 'UTF8')) AS payload_hash
+                FROM batch
+            ),
+            stored AS (
+                INSERT INTO webhook_payloads (payload_hash, payload)
+                SELECT DISTINCT ON (payload_hash) payload_hash, payload
+                FROM hashed
+                WHERE payload IS NOT NULL
+                ON CONFLICT (payload_hash) DO NOTHING
+            )
+            INSERT INTO webhook_responses (lead_id, payload_hash, response_code, response_body, source_type)
+            SELECT lead_id, payload_hash, response_code, response_body, source_type FROM hashed
+        """, rows, template="(%s, %s::jsonb, %s::integer, %s, %s)", page_size=max(len(rows), 1))
 
-    def log_processing(self, source_type, file_name, records_processed, success_count, failure_count):
-        with self.conn.cursor() as cur:
+    def _backfill_rollups(self, cur):
+        """Rebuild the rollup tables from the raw log tables"""
+        cur.execute("TRUNCATE processing_rollup_daily, webhook_rollup_hourly")
+        cur.execute("""
+            INSERT INTO processing_rollup_daily
+            (bucket, source_type, file_count, records_processed, success_count, failure_count)
+            SELECT processed_at::date, source_type, COUNT(*),
+                   COALESCE(SUM(records_processed), 0),
+                   COALESCE(SUM(success_count), 0),
+                   COALESCE(SUM(failure_count), 0)
+            FROM processing_logs
+            WHERE processed_at IS NOT NULL AND source_type IS NOT NULL
+            GROUP BY 1, 2
+        """)
+        cur.execute("""
+            INSERT INTO webhook_rollup_hourly (bucket, source_type, response_code, request_count)
+            SELECT DATE_TRUNC('hour', sent_at), COALESCE(source_type, ''), response_code, COUNT(*)
+            FROM webhook_responses
+            WHERE sent_at IS NOT NULL AND response_code IS NOT NULL
+            GROUP BY 1, 2, 3
+        """)
+
+    def rebuild_rollups(self):
+        """Recompute the rollups from the log rows still present"""
+        with self.connection() as conn, conn.cursor() as cur:
+            self._backfill_rollups(cur)
+
+    def _add_webhook_rollup(self, cur, counts):
+        """Upsert {(source_type, response_code): count} into the current hour"""
+        execute_values(cur, """
+            INSERT INTO webhook_rollup_hourly (bucket, source_type, response_code, request_count)
+            VALUES %s
+            ON CONFLICT (bucket, source_type, response_code)
+            DO UPDATE SET request_count = webhook_rollup_hourly.request_count + EXCLUDED.request_count
+        """, [(source_type, response_code, count) for (source_type, response_code), count in sorted(counts.items())],
+            template="(DATE_TRUNC('hour', CURRENT_TIMESTAMP), %s, %s, %s)")
+
+    @timed('db.log_processing')
+    def log_processing(self, source_type, file_name, records_processed, success_count, failure_count,
+                       file_hash=None):
+        with self.connection() as conn, conn.cursor() as cur:
             cur.execute("""
                 INSERT INTO processing_logs 
-                (source_type, file_name, records_processed, success_count, failure_count)
-                VALUES (%s, %s, %s, %s, %s)
+                (source_type, file_name, records_processed, success_count, failure_count, file_hash)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                RETURNING id, processed_at
+            """, (source_type, file_name, records_processed, success_count, failure_count,
+                  psycopg2.Binary(file_hash) if file_hash is not None else None))
+            log_id, processed_at = cur.fetchone()
+            if source_type is None:
+                return log_id
+            cur.execute("""
+                INSERT INTO processing_rollup_daily
+                (bucket, source_type, file_count, records_processed, success_count, failure_count)
+                VALUES (%s::date, %s, 1, %s, %s, %s)
+                ON CONFLICT (bucket, source_type) DO UPDATE SET
+                    file_count = processing_rollup_daily.file_count + 1,
+                    records_processed = processing_rollup_daily.records_processed + EXCLUDED.records_processed,
+                    success_count = processing_rollup_daily.success_count + EXCLUDED.success_count,
+                    failure_count = processing_rollup_daily.failure_count + EXCLUDED.failure_count
+            """, (processed_at, source_type, records_processed or 0, success_count or 0, failure_count or 0))
+            return log_id
+
+    @timed('db.log_webhook_response')
+    def log_webhook_response(self, lead_id, payload, response_code, response_body, source_type=None):
+        row = (lead_id, payload, response_code, response_body, source_type)
+        if self.buffer_size <= 0:
+            # Written straight away; only the rollup count waits for the next flush
+            with self.connection() as conn, conn.cursor() as cur:
+                self._insert_webhook_responses(cur, [row])
+        with self._buffer_lock:
+            if self.buffer_size > 0:
+                self._webhook_buffer.append(row)
+            key = (source_type or '', response_code)
+            self._rollup_counts[key] = self._rollup_counts.get(key, 0) + 1
+            due = (0 < self.buffer_size <= len(self._webhook_buffer) or
+                   time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def enqueue_leads(self, source_type, file_name, leads):
+        """Bulk insert (lead_id, lead_json) pairs into the outbox as pending"""
+        rows = [(source_type, file_name, lead_id, lead_json) for lead_id, lead_json in leads]
+        if not rows:
+            return 0
+        with self.connection() as conn, conn.cursor() as cur:
+            execute_values(cur, """
+                INSERT INTO lead_outbox (source_type, file_name, lead_id, lead)
+                VALUES %s
+            """, rows, template="(%s, %s, %s, %s::jsonb)", page_size=1000)
+        return len(rows)
+
+    def log_stage_timings(self, snapshot):
+        """Store a StageMetrics snapshot, one row per stage"""
+        rows = [(stage, entry['calls'], entry['rows'], entry['total_seconds'],
+                 entry['p50_seconds'], entry['p99_seconds'], entry['max_seconds'])
+                for stage, entry in snapshot.items()]
+        with self.connection() as conn, conn.cursor() as cur:
+            execute_values(cur, """
+                INSERT INTO stage_timings
+                (stage, calls, rows_processed, total_seconds, p50_seconds, p99_seconds, max_seconds)
+                VALUES %s
+            """, rows)
+
+    def log_rejected_leads(self, source_type, file_name, rejects):
+        """Bulk insert (lead_id, reasons, lead_json) tuples for rejected rows"""
+        rows = [(source_type, file_name, lead_id, reasons, lead_json)
+                for lead_id, reasons, lead_json in rejects]
+        if not rows:
+            return 0
+        with self.connection() as conn, conn.cursor() as cur:
+            execute_values(cur, """
+                INSERT INTO rejected_leads (source_type, file_name, lead_id, reasons, lead)
+                VALUES %s
+            """, rows, template="(%s, %s, %s, %s, %s::jsonb)", page_size=1000)
+        return len(rows)
+
+    def claim_leads(self, batch_size, lease_seconds=300, max_attempts=5):
+        """Claim up to batch_size outbox rows for this worker.
+
+        Rows locked by another worker are skipped. Claimed rows are leased
+        for lease_seconds; rows whose lease has expired (their worker died)
+        are claimed again, unless they already had max_attempts, in which
+        case they are marked failed.
+        Returns (id, lead, claimed_at, source_type) rows in insertion order;
+        claimed_at is the same for the whole batch and identifies this claim
+        to renew_leads and finish_leads.
+        """
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                UPDATE lead_outbox
+                SET status = 'failed',
+                    last_error = COALESCE(last_error, 'lease expired') || ' (gave up after ' || attempts || ' attempts)'
+                WHERE attempts >= %s
+                  AND (status = 'pending'
+                       OR (status = 'in_flight' AND lease_expires_at < CURRENT_TIMESTAMP))
+            """, (max_attempts,))
+            cur.execute("""
+                UPDATE lead_outbox o
+                SET status = 'in_flight',
+                    claimed_at = CURRENT_TIMESTAMP,
+                    lease_expires_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second',
+                    attempts = o.attempts + 1
+                FROM (
+                    SELECT id FROM lead_outbox
+                    WHERE (status = 'pending'
+                           OR (status = 'in_flight' AND lease_expires_at < CURRENT_TIMESTAMP))
+                      AND attempts < %s
+                    ORDER BY id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                ) claimed
+                WHERE o.id = claimed.id
+                RETURNING o.id, o.lead, o.claimed_at, o.source_type
+            """, (lease_seconds, max_attempts, batch_size))
+            rows = sorted(cur.fetchall())
+        return rows
+
+    def renew_leads(self, ids, claimed_at, lease_seconds=300):
+        """Extend the lease on rows still held under the claim made at claimed_at.
+
+        Returns the ids still held; the others were reclaimed by another
+        worker after their lease expired and must not be sent again.
+        """
+        if not ids:
+            return set()
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                UPDATE lead_outbox
+                SET lease_expires_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+                WHERE id = ANY(%s) AND claimed_at = %s AND status = 'in_flight'
                 RETURNING id
-            """, (source_type, file_name, records_processed, success_count, failure_count))
-            self.conn.commit()
-            return cur.fetchone()[0]
-
-    def log_webhook_response(self, lead_id, payload, response_code, response_body):
-        with self.conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO webhook_responses 
-                (lead_id, payload, response_code, response_body)
-                VALUES (%s, %s, %s, %s)
-            """, (lead_id, payload, response_code, response_body))
-            self.conn.commit()
+            """, (lease_seconds, list(ids), claimed_at))
+            return {row[0] for row in cur.fetchall()}
+
+    def finish_leads(self, sent_ids, failures, max_attempts=5, claimed_at=None):
+        """Mark claimed outbox rows as sent or failed.
+
+        failures holds (id, error, retryable) tuples; retryable rows go back
+        to pending until they reach max_attempts. With claimed_at, only rows
+        still held under that claim are updated, so a worker whose lease ran
+        out cannot overwrite the outcome of the worker that reclaimed them.
+        """
+        with self.connection() as conn, conn.cursor() as cur:
+            if sent_ids:
+                cur.execute("""
+                    UPDATE lead_outbox
+                    SET status = 'sent', sent_at = CURRENT_TIMESTAMP, last_error = NULL
+                    WHERE id = ANY(%s)
+                      AND (%s::timestamp IS NULL OR claimed_at = %s::timestamp)
+                """, (list(sent_ids), claimed_at, claimed_at))
+            if failures:
+                rows = [(lead_id, error, retryable, max_attempts, claimed_at)
+                        for lead_id, error, retryable in failures]
+                execute_values(cur, """
+                    UPDATE lead_outbox o
+                    SET status = CASE WHEN f.retryable AND o.attempts < f.max_attempts
+                                      THEN 'pending' ELSE 'failed' END,
+                        last_error = f.error
+                    FROM (VALUES %s) AS f (id, error, retryable, max_attempts, claimed_at)
+                    WHERE o.id = f.id
+                      AND o.status = 'in_flight'
+                      AND (f.claimed_at IS NULL OR o.claimed_at = f.claimed_at)
+                """, rows, template="(%s::bigint, %s, %s::boolean, %s::integer, %s::timestamp)")
+
+    def find_match_keys(self, key_hashes):
+        """Return the subset of key_hashes already in lead_match_keys"""
+        if not key_hashes:
+            return set()
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT key_hash FROM lead_match_keys WHERE key_hash = ANY(%s)
+            """, (list(key_hashes),))
+            found = {row[0] for row in cur.fetchall()}
+        return found
+
+    def add_match_keys(self, source_type, key_hashes):
+        """Record match key hashes, ignoring ones already present"""
+        if not key_hashes:
+            return
+        with self.connection() as conn, conn.cursor() as cur:
+            execute_values(cur, """
+                INSERT INTO lead_match_keys (key_hash, source_type)
+                VALUES %s
+                ON CONFLICT (key_hash) DO NOTHING
+            """, [(key_hash, source_type) for key_hash in key_hashes], page_size=1000)
+
+    def find_ingested_file(self, file_hash):
+        """(source_type, file_name, ingested_at) of an earlier ingest of this file, or None"""
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT source_type, file_name, ingested_at FROM ingested_files WHERE file_hash = %s
+            """, (psycopg2.Binary(file_hash),))
+            return cur.fetchone()
+
+    def add_ingested_file(self, file_hash, source_type, file_name, records_read, records_new):
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO ingested_files (file_hash, source_type, file_name, records_read, records_new)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (file_hash) DO NOTHING
+            """, (psycopg2.Binary(file_hash), source_type, file_name, records_read, records_new))
+
+    def find_row_hashes(self, row_hashes):
+        """Return the subset of row_hashes already in ingested_rows"""
+        if not row_hashes:
+            return set()
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT row_hash FROM ingested_rows WHERE row_hash = ANY(%s)
+            """, (list(row_hashes),))
+            found = {row[0] for row in cur.fetchall()}
+        return found
+
+    def add_row_hashes(self, source_type, row_hashes):
+        """Record row fingerprints, ignoring ones already present"""
+        if not row_hashes:
+            return
+        with self.connection() as conn, conn.cursor() as cur:
+            execute_values(cur, """
+                INSERT INTO ingested_rows (row_hash, source_type)
+                VALUES %s
+                ON CONFLICT (row_hash) DO NOTHING
+            """, [(row_hash, source_type) for row_hash in row_hashes], page_size=1000)
+
+    @timed('db.flush')
+    def flush(self):
+        """Write any buffered webhook responses and their rollup counts in one transaction"""
+        with self._buffer_lock:
+            rows, self._webhook_buffer = self._webhook_buffer, []
+            counts, self._rollup_counts = self._rollup_counts, {}
+            self._last_flush = time.monotonic()
+            if not counts:
+                return 0
+            try:
+                with self.connection() as conn, conn.cursor() as cur:
+                    if rows:
+                        self._insert_webhook_responses(cur, rows)
+                    self._add_webhook_rollup(cur, counts)
+            except Exception:
+                # Put the rows and counts back so a later flush can retry them
+                self._webhook_buffer[:0] = rows
+                self._rollup_counts = counts
+                raise
+        return len(rows)
+
+    def close(self):
+        """Flush buffered rows and counts; pooled connections stay open for other users"""
+        self.flush()
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+# Normalized columns whose values identify the same consumer across sources
+PHONE_FIELDS = ['phone', 'phone2', 'phone3']
+
+class LeadDeduplicator:
+    """Drops leads whose phone, email or address+zip has been seen before.
+
+    Match keys are hashed to 64-bit integers and checked against the
+    lead_match_keys table with one indexed lookup per batch. Hashes already
+    known to this process are answered from an in-memory set without
+    touching the database.
+    """
+
+    def __init__(self, database, cache_size=5_000_000):
+        self.db = database
+        self.cache_size = cache_size
+        self.seen = set()
+
+    def _match_keys(self, normalized):
+        """DataFrame of (row, key_hash) pairs, ordered by row position"""
+        keys = []
+        for field in PHONE_FIELDS:
+            if field in normalized:
+                keys.append(('phone:', normalized[field].astype(str)))
+        if 'email' in normalized:
+            keys.append(('email:', normalized['email'].astype(str)))
+        if 'address' in normalized and 'zip' in normalized:
+            address = normalized['address'].astype(str).str.lower().str.split().str.join(' ')
+            zip_code = normalized['zip'].astype(str)
+            keys.append(('address:', (address + '|' + zip_code).where((address != '') & (zip_code != ''), '')))
+
+        rows = np.arange(len(normalized))
+        frames = []
+        for prefix, values in keys:
+            present = (values != '').to_numpy()
+            frames.append(pd.DataFrame({
+                'row': rows[present],
+                'key': (prefix + values[present]).to_numpy(dtype=object)
+            }))
+        if not frames:
+            return pd.DataFrame({'row': [], 'key_hash': []}, dtype='int64')
+
+        stacked = pd.concat(frames, ignore_index=True)
+        stacked['key_hash'] = pd.util.hash_array(stacked['key'].to_numpy()).view('int64')
+        # The same value twice in one row (e.g. phone == phone2) is not a match
+        return (stacked[['row', 'key_hash']]
+                .drop_duplicates()
+                .sort_values('row', kind='stable', ignore_index=True))
+
+    def filter(self, normalized, source_type=None):
+        """Split a normalized frame into (unique, duplicates).
+
+        A row is a duplicate if any of its keys was seen in an earlier batch
+        or an earlier row of this one. Nothing is recorded here; call
+        commit() with the unique rows once they were delivered or queued.
+        """
+        keys = self._match_keys(normalized)
+        if keys.empty:
+            return normalized, normalized.iloc[0:0]
+
+        batch_hashes = keys['key_hash'].unique().tolist()
+        known = {key_hash for key_hash in batch_hashes if key_hash in self.seen}
+        known.update(self.db.find_match_keys([key_hash for key_hash in batch_hashes if key_hash not in known]))
+
+        seen_before = keys['key_hash'].isin(known) | keys['key_hash'].duplicated()
+        duplicate = np.zeros(len(normalized), dtype=bool)
+        duplicate[keys.loc[seen_before, 'row'].to_numpy()] = True
+        return normalized[~duplicate], normalized[duplicate]
+
+    def commit(self, delivered, source_type=None):
+        """Record the match keys of leads that were delivered or queued"""
+        batch_hashes = self._match_keys(delivered)['key_hash'].unique().tolist()
+        if not batch_hashes:
+            return
+        self.db.add_match_keys(source_type, batch_hashes)
+
+        if len(self.seen) + len(batch_hashes) > self.cache_size:
+            self.seen.clear()
+        self.seen.update(batch_hashes)
@@ -0,0 +1,102 @@
+import hashlib
+import pandas as pd
+
+# Bytes read per step while hashing an uploaded file
+HASH_BLOCK_SIZE = 1 << 20
+
+def hash_file(file):
+    """SHA-256 digest of a path or file-like object's content"""
+    digest = hashlib.sha256()
+    if isinstance(file, str):
+        with open(file, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+        return digest.digest()
+
+    file.seek(0)
+    while True:
+        block = file.read(HASH_BLOCK_SIZE)
+        if not block:
+            break
+        digest.update(block.encode() if isinstance(block, str) else block)
+    file.seek(0)
+    return digest.digest()
+
+def canonical_frame(normalized):
+    """normalized with every column in one dtype per kind, for hashing.
+
+    normalize_data leaves a numeric field int64 in a chunk without blanks
+    and float64 in one with any, and compact mode downcasts it further;
+    hash_pandas_object hashes 700 and 700.0 differently. So all numbers
+    become float64, categoricals and strings object, and nullable booleans
+    plain bools with missing as False, whatever chunk or mode a row came from.
+    """
+    columns = {}
+    for name, column in normalized.items():
+        dtype = column.dtype
+        if isinstance(dtype, (pd.CategoricalDtype, pd.StringDtype)):
+            column = column.astype(object)
+        elif pd.api.types.is_bool_dtype(dtype):
+            column = column.fillna(False).astype(bool)
+        elif pd.api.types.is_numeric_dtype(dtype):
+            column = column.astype('float64')
+        columns[name] = column
+    return pd.DataFrame(columns, index=normalized.index)
+
+class IngestFingerprints:
+    """Remembers which files and normalized rows were already ingested.
+
+    Files are fingerprinted by the SHA-256 of their content, so an identical
+    re-upload is recognised before it is parsed. Rows are fingerprinted by a
+    64-bit hash of their normalized values and checked against ingested_rows
+    with one indexed lookup per batch, so an overlapping file only passes on
+    the rows not seen before. Hashes already known to this process are
+    answered from an in-memory set.
+    """
+
+    def __init__(self, database, cache_size=5_000_000):
+        self.db = database
+        self.cache_size = cache_size
+        self.seen = set()
+
+    def file_hash(self, file):
+        return hash_file(file)
+
+    def seen_file(self, file_hash):
+        """(source_type, file_name, ingested_at) of an earlier identical upload, or None"""
+        return self.db.find_ingested_file(file_hash)
+
+    def record_file(self, file_hash, source_type, file_name, records_read, records_new):
+        self.db.add_ingested_file(file_hash, source_type, file_name, records_read, records_new)
+
+    def row_hashes(self, normalized):
+        """int64 fingerprint per row, independent of the index and of compact dtypes"""
+        return pd.util.hash_pandas_object(canonical_frame(normalized), index=False).to_numpy().view('int64')
+
+    def filter(self, normalized, source_type=None):
+        """Split a normalized frame into (new, seen).
+
+        A row is seen if an identical row was ingested before, or appeared
+        earlier in this batch. Nothing is recorded here; call commit() with
+        the new rows once they were delivered or queued.
+        """
+        if normalized.empty:
+            return normalized, normalized
+        hashes = pd.Series(self.row_hashes(normalized))
+        batch_hashes = hashes.unique().tolist()
+        known = {row_hash for row_hash in batch_hashes if row_hash in self.seen}
+        known.update(self.db.find_row_hashes([row_hash for row_hash in batch_hashes if row_hash not in known]))
+
+        seen_before = (hashes.isin(known) | hashes.duplicated()).to_numpy()
+        return normalized[~seen_before], normalized[seen_before]
+
+    def commit(self, delivered, source_type=None):
+        """Record rows as ingested once they were delivered or queued"""
+        if delivered.empty:
+            return
+        batch_hashes = pd.unique(self.row_hashes(delivered)).tolist()
+        self.db.add_row_hashes(source_type, batch_hashes)
+
+        if len(self.seen) + len(batch_hashes) > self.cache_size:
+            self.seen.clear()
+        self.seen.update(batch_hashes)
@@ -1,25 +1,289 @@
+import functools
+import time
+from collections import deque
+import numpy as np
 import pandas as pd
 from utils.experian_parser import ExperianParser
 from utils.transunion_parser import TransUnionParser
 from utils.leadsource_parser import LeadSourceParser
+from utils.source_schemas import get_schema
+from models.fingerprint import hash_file
+from models.metrics import metrics, timed
+
+# Rows read per chunk in streaming mode
+DEFAULT_CHUNKSIZE = 5000
+
+# String values treated as True for boolean fields
+BOOLEAN_TOKENS = ['yes', 'true', '1', 'y', 't']
+
+# Compact mode storage: low-cardinality text as categoricals, phones and
+# zips as Arrow-backed strings (when pyarrow is installed), scores as the
+# smallest integer type that fits and flags as nullable booleans
+CATEGORY_FIELDS = ['state', 'loan_type', 'loan_purpose', 'property_purpose', 'property_description']
+STRING_FIELDS = ['phone', 'phone2', 'phone3', 'zip']
+INTEGER_FIELDS = ['credit_score']
+BOOLEAN_FIELDS = ['cash_out', 'found_home', 'va_eligible']
+
+_worker_processor = None
+
+def _parse_and_normalize(source_type, chunk, compact=False):
+    """Process pool task: parse and normalize one raw chunk"""
+    global _worker_processor
+    if _worker_processor is None or _worker_processor.compact != compact:
+        _worker_processor = LeadProcessor(compact)
+    parser = _worker_processor._get_parser(source_type)
+    return _worker_processor.normalize_data(parser.parse(chunk))
+
+@functools.lru_cache(maxsize=None)
+def _compact_string_dtype():
+    """Arrow-backed string dtype, or None when pyarrow is not installed"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return None
+    return pd.StringDtype('pyarrow')
+
+def memory_per_row(normalized):
+    """Deep memory use of a frame in bytes per row, in total and by column"""
+    rows = max(len(normalized), 1)
+    usage = normalized.memory_usage(deep=True, index=False)
+    return {
+        'total': round(usage.sum() / rows, 1),
+        'columns': {column: round(size / rows, 1) for column, size in usage.items()}
+    }
 
 class LeadProcessor:
-    def __init__(self):
+    def __init__(self, compact=False):
+        """compact=True makes normalize_data return compact dtypes (see CATEGORY_FIELDS)"""
+        self.compact = compact
         self.experian_parser = ExperianParser()
         self.transunion_parser = TransUnionParser()
         self.leadsource_parser = LeadSourceParser()
+        self.parsers = {
+            'experian': self.experian_parser,
+            'transunion': self.transunion_parser,
+            'leadsource': self.leadsource_parser
+        }
 
-    def process_file(self, file, source_type):
-        df = pd.read_csv(file)
-        
-        if source_type == "experian":
-            return self.experian_parser.parse(df)
-        elif source_type == "transunion":
-            return self.transunion_parser.parse(df)
-        elif source_type == "leadsource":
-            return self.leadsource_parser.parse(df)
-        else:
-            raise ValueError(f"Unknown source type: {source_type}")
+    def _get_parser(self, source_type):
+        schema = get_schema(source_type)
+        if source_type not in self.parsers:
+            self.parsers[source_type] = schema.parser_class()
+        return self.parsers[source_type]
+
+    def _read_csv(self, file, source_type, **kwargs):
+        """Read only the columns the source's schema lists, with their dtypes"""
+        schema = get_schema(source_type)
+        header = pd.read_csv(file, nrows=0).columns
+        if hasattr(file, 'seek'):
+            file.seek(0)
+        if kwargs.get('engine') == 'pyarrow':
+            return self._read_csv_arrow(file, schema, header)
+        usecols, dtype = schema.read_options(header)
+        return pd.read_csv(file, usecols=usecols, dtype=dtype, **kwargs)
+
+    def _read_csv_arrow(self, file, schema, header):
+        """_read_csv with pyarrow's CSV reader.
+
+        pandas' pyarrow engine rejects positional usecols, keeps duplicated
+        headers unmangled and only applies dtypes after inferring types
+        (so zips lose leading zeros). Reading with pyarrow.csv directly, the
+        columns are named as pandas names them and typed while parsing.
+        """
+        import pyarrow
+        from pyarrow import csv
+
+        names, dtype = schema.read_options(header, by_name=True)
+        column_types = {
+            name: pyarrow.string() if kind is str else pyarrow.from_numpy_dtype(np.dtype(kind))
+            for name, kind in dtype.items()
+        }
+        table = csv.read_csv(
+            file,
+            read_options=csv.ReadOptions(column_names=list(header), skip_rows=1),
+            convert_options=csv.ConvertOptions(include_columns=names, column_types=column_types,
+                                               strings_can_be_null=True)
+        )
+        return table.to_pandas()
+
+    @timed('process_file', rows=len)
+    def process_file(self, file, source_type, engine=None):
+        """Parse a whole vendor file; engine='pyarrow' reads it with pyarrow's CSV reader (requires pyarrow)"""
+        parser = self._get_parser(source_type)
+        df = self._read_csv(file, source_type, engine=engine)
+        return parser.parse(df)
+
+    def _normalized_chunks(self, file, source_type, chunksize, processes):
+        parser = self._get_parser(source_type)
+        chunks = iter(self._read_csv(file, source_type, chunksize=chunksize))
+        if processes and processes > 1:
+            yield from self._normalize_in_pool(chunks, source_type, processes)
+            return
+        while True:
+            # Reading and parsing each chunk counts toward the process_file stage
+            started = time.perf_counter()
+            chunk = next(chunks, None)
+            if chunk is None:
+                break
+            parsed = parser.parse(chunk)
+            metrics.observe('process_file', time.perf_counter() - started, len(parsed))
+            yield self.normalize_data(parsed)
+
+    def _normalize_in_pool(self, chunks, source_type, processes):
+        """Parse and normalize chunks across processes, yielding them in file order.
+
+        The CSV is read here and raw chunks are shipped to the workers; at
+        most two chunks per worker are in flight so memory stays bounded.
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            pending = deque()
+            for chunk in chunks:
+                if len(pending) >= processes * 2:
+                    yield pending.popleft().result()
+                pending.append(executor.submit(_parse_and_normalize, source_type, chunk, self.compact))
+            while pending:
+                yield pending.popleft().result()
+
+    def iter_chunks(self, file, source_type, chunksize=DEFAULT_CHUNKSIZE, deduplicator=None,
+                    validator=None, processes=None, fingerprints=None, staging=None):
+        """Yield normalized DataFrames of at most chunksize rows each.
+
+        Only a few chunks are held in memory at a time, so memory use does
+        not grow with the size of the file. With processes > 1, parsing and
+        normalization run in a process pool; chunks still come out in file
+        order. With a LeadValidator, rows failing the processing rules are
+        rejected next; with a LeadDeduplicator, leads already seen from any
+        source are then dropped.
+
+        With IngestFingerprints, a file identical to an earlier upload yields
+        nothing without being read, and rows ingested before are dropped
+        ahead of validation. Nothing is recorded as ingested here; stream_file
+        and enqueue_file do that for the rows they deliver or queue.
+
+        With a StagingCache, normalized chunks are read back from Parquet
+        when this file was staged before, and staged for next time if not.
+        """
+        file_hash = hash_file(file) if fingerprints is not None or staging is not None else None
+        if fingerprints is not None and fingerprints.seen_file(file_hash) is not None:
+            return
+        yield from self._filtered_chunks(file, source_type, file_hash, chunksize, deduplicator,
+                                         validator, processes, fingerprints, staging)
+
+    def _filtered_chunks(self, file, source_type, file_hash, chunksize, deduplicator, validator,
+                         processes, fingerprints, staging, stats=None):
+        """Yield the filtered chunks for iter_chunks.
+
+        Rows read, rows not ingested before and rows rejected by the
+        validator are added to stats' records_read, records_new and
+        records_rejected.
+        """
+        stats = {} if stats is None else stats
+        for key in ('records_read', 'records_new', 'records_rejected'):
+            stats.setdefault(key, 0)
+        file_name = file if isinstance(file, str) else getattr(file, 'name', None)
+        chunks = self._normalized_chunks(file, source_type, chunksize, processes)
+        if staging is not None:
+            chunks = staging.stage(source_type, file_hash, chunks, chunksize,
+                                   variant='compact' if self.compact else None)
+        for normalized in chunks:
+            stats['records_read'] += len(normalized)
+            if fingerprints is not None:
+                normalized, _ = fingerprints.filter(normalized, source_type)
+            stats['records_new'] += len(normalized)
+            if validator is not None:
+                normalized, rejected = validator.validate(normalized, source_type, file_name)
+                stats['records_rejected'] += len(rejected)
+            if deduplicator is not None:
+                normalized, _ = deduplicator.filter(normalized, source_type)
+            yield normalized
+
+    def _deliver_chunks(self, file, source_type, deliver, chunksize, deduplicator, validator,
+                        processes, fingerprints, staging, file_hash=None, stats=None):
+        """Run each filtered chunk through deliver and commit what it delivered.
+
+        deliver takes a normalized frame and returns one result per row,
+        True when the lead was delivered (or queued). Fingerprints are only
+        recorded for those rows, and the file only when no lead failed with
+        a retryable error, so leads lost to an outage are picked up again
+        when the file is re-ingested.
+        A caller passing file_hash has already hashed the file and, with
+        fingerprints, checked it with seen_file. The row counts are kept in
+        stats as _filtered_chunks describes.
+        Yields (normalized, results) per chunk.
+        """
+        file_name = file if isinstance(file, str) else getattr(file, 'name', None)
+        if file_hash is None:
+            file_hash = hash_file(file) if fingerprints is not None or staging is not None else None
+            if fingerprints is not None and fingerprints.seen_file(file_hash) is not None:
+                return
+        stats = {} if stats is None else stats
+        retryable = 0
+        for normalized in self._filtered_chunks(file, source_type, file_hash, chunksize, deduplicator,
+                                                validator, processes, fingerprints, staging, stats):
+            results = deliver(normalized)
+            delivered = [result is True for result in results]
+            self.commit(normalized[delivered], source_type, fingerprints, deduplicator)
+            if not all(delivered):
+                from models.webhook import RetryableWebhookError
+                retryable += sum(isinstance(result, RetryableWebhookError) for result in results)
+            yield normalized, results
+        if fingerprints is not None and not retryable:
+            fingerprints.record_file(file_hash, source_type, file_name,
+                                     stats['records_read'], stats['records_new'])
+
+    def commit(self, delivered, source_type, fingerprints=None, deduplicator=None):
+        """Record delivered or queued rows so later ingests skip them"""
+        if fingerprints is not None:
+            fingerprints.commit(delivered, source_type)
+        if deduplicator is not None:
+            deduplicator.commit(delivered, source_type)
+
+    def normalize_file(self, file, source_type, chunksize=DEFAULT_CHUNKSIZE, processes=None, staging=None):
+        """Parse and normalize a whole file, optionally across processes, into one DataFrame"""
+        chunks = list(self.iter_chunks(file, source_type, chunksize, processes=processes, staging=staging))
+        if not chunks:
+            return self.normalize_data(self.process_file(file, source_type))
+        return pd.concat(chunks)
+
+    def stream_file(self, file, source_type, sender, chunksize=DEFAULT_CHUNKSIZE, concurrency=8,
+                    deduplicator=None, validator=None, processes=None, fingerprints=None, staging=None,
+                    file_hash=None, stats=None):
+        """Parse, normalize and send a file chunk by chunk.
+
+        Yields a (lead_data, result) pair per lead as each chunk is sent,
+        where result is True or the WebhookError for that lead. Only leads
+        that were sent are recorded with fingerprints and the deduplicator.
+        Pass file_hash when the file was already hashed; a stats dict is
+        filled with the records_read, records_new and records_rejected counts.
+        """
+        for normalized, results in self._deliver_chunks(
+                file, source_type, lambda normalized: sender.send_frame(normalized, concurrency, source_type),
+                chunksize, deduplicator, validator, processes, fingerprints, staging, file_hash, stats):
+            yield from zip(normalized.to_dict('records'), results)
+
+    def enqueue_file(self, file, source_type, database, file_name=None, chunksize=DEFAULT_CHUNKSIZE,
+                     deduplicator=None, validator=None, processes=None, fingerprints=None,
+                     staging=None, file_hash=None, stats=None):
+        """Parse and normalize a file chunk by chunk into the lead_outbox table.
+
+        Returns the number of leads queued. Delivery is left to OutboxWorker.
+        Rows are recorded with fingerprints and the deduplicator once their
+        insert succeeded. file_hash and stats are as for stream_file.
+        """
+        def enqueue(normalized):
+            lead_ids = normalized['lead_id'].astype(str).tolist() if 'lead_id' in normalized else [None] * len(normalized)
+            lead_json = normalized.to_json(orient='records', lines=True).splitlines()
+            database.enqueue_leads(source_type, file_name, zip(lead_ids, lead_json))
+            return [True] * len(normalized)
+
+        queued = 0
+        for normalized, _ in self._deliver_chunks(file, source_type, enqueue, chunksize, deduplicator,
+                                                  validator, processes, fingerprints, staging,
+                                                  file_hash, stats):
+            queued += len(normalized)
+        return queued
 
     def _format_phone(self, phone):
         if pd.isna(phone) or phone == '':
@@ -42,9 +306,51 @@ class LeadProcessor:
         if isinstance(value, (int, float)):
             return bool(value)
         if isinstance(value, str):
-            return value.lower() in ('yes', 'true', '1', 'y', 't')
+            return value.lower() in BOOLEAN_TOKENS
         return False
 
+    def _format_phone_column(self, series):
+        """Column-wise equivalent of _format_phone"""
+        clean_phone = series.astype(str).str.replace(r'\D', '', regex=True).str[-10:]
+        valid = (series.notna() & (clean_phone.str.len() == 10) &
+                 ~clean_phone.str.fullmatch(r'0+').fillna(False).astype(bool))
+        return clean_phone.where(valid, '')
+
+    def _convert_to_boolean_column(self, series):
+        """Column-wise equivalent of _convert_to_boolean"""
+        if pd.api.types.is_bool_dtype(series):
+            return series.fillna(False).astype(bool)
+        if pd.api.types.is_numeric_dtype(series):
+            return series.fillna(0) != 0
+        kind = pd.api.types.infer_dtype(series, skipna=True)
+        if kind == 'boolean':
+            return series.fillna(False).astype(bool)
+        if kind in ('integer', 'floating', 'mixed-integer-float', 'decimal'):
+            return pd.to_numeric(series, errors='coerce').fillna(0) != 0
+        if kind not in ('string', 'empty', 'mixed', 'mixed-integer'):
+            return pd.Series(False, index=series.index)
+        # Strings match on tokens, any remaining numbers/bools on truthiness
+        lowered = series.str.lower()
+        is_text = lowered.notna()
+        numbers = pd.to_numeric(series.where(~is_text).astype(object), errors='coerce')
+        return lowered.isin(BOOLEAN_TOKENS).where(is_text, numbers.fillna(0) != 0).astype(bool)
+
+    def compact_frame(self, normalized):
+        """Copy of a normalized frame converted to the compact dtypes"""
+        string_dtype = _compact_string_dtype()
+        compact = normalized.copy(deep=False)
+        for field in normalized.columns:
+            if field in CATEGORY_FIELDS:
+                compact[field] = normalized[field].astype('category')
+            elif field in STRING_FIELDS and string_dtype is not None:
+                compact[field] = normalized[field].astype(string_dtype)
+            elif field in INTEGER_FIELDS:
+                compact[field] = pd.to_numeric(normalized[field].round(), downcast='integer')
+            elif field in BOOLEAN_FIELDS:
+                compact[field] = normalized[field].astype('boolean')
+        return compact
+
+    @timed('normalize_data', rows=len)
     def normalize_data(self, df):
         # Standardize column names and formats
         normalized = pd.DataFrame()
@@ -105,7 +411,11 @@ class LeadProcessor:
                 
                 # Handle boolean fields
                 elif new_col in boolean_fields:
-                    normalized[new_col] = normalized[new_col].apply(self._convert_to_boolean)
+                    normalized[new_col] = self._convert_to_boolean_column(normalized[new_col])
+                    if self.compact:
+                        # Keep "not provided" apart from an explicit no
+                        blank = df[orig_col].isna() | (df[orig_col].astype(str).str.strip() == '')
+                        normalized[new_col] = normalized[new_col].astype('boolean').mask(blank)
                 
                 # Special handling for loan_type
                 elif new_col == 'loan_type':
@@ -113,7 +423,7 @@ class LeadProcessor:
                 
                 # Handle all phone numbers with improved formatting
                 elif new_col in ['phone', 'phone2', 'phone3']:
-                    normalized[new_col] = df[orig_col].apply(self._format_phone)
+                    normalized[new_col] = self._format_phone_column(df[orig_col])
                 
                 # Clean and validate email
                 elif new_col == 'email':
@@ -136,4 +446,6 @@ class LeadProcessor:
                     # Take first 5 digits only if present
                     normalized[new_col] = normalized[new_col].str[:5]
         
+        if self.compact:
+            normalized = self.compact_frame(normalized)
         return normalized
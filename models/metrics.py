@@ -0,0 +1,148 @@
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in seconds; the last bucket catches the rest
+BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float('inf')]
+
+class StageMetrics:
+    """Per-stage latency histograms and row counts, held in memory.
+
+    Cheap enough to leave on in production: one perf_counter pair and a
+    locked counter update per observation.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Totals since start, for /metrics scrapes, and since the last write_to
+        self._stages = {}
+        self._window = {}
+
+    def observe(self, stage, seconds, rows=1):
+        with self._lock:
+            for stages in (self._stages, self._window):
+                entry = stages.get(stage)
+                if entry is None:
+                    entry = stages[stage] = {
+                        'calls': 0, 'rows': 0, 'total_seconds': 0.0, 'max_seconds': 0.0,
+                        'buckets': [0] * len(BUCKETS)
+                    }
+                entry['calls'] += 1
+                entry['rows'] += rows
+                entry['total_seconds'] += seconds
+                entry['max_seconds'] = max(entry['max_seconds'], seconds)
+                entry['buckets'][bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    @contextmanager
+    def time(self, stage, rows=1):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started, rows)
+
+    def snapshot(self, reset=False, window=False):
+        """Copy of every stage's counters, with p50/p99 estimated from the buckets.
+
+        window=True covers only the observations since the last write_to.
+        """
+        with self._lock:
+            source = self._window if window else self._stages
+            stages = {stage: dict(entry, buckets=list(entry['buckets']))
+                      for stage, entry in source.items()}
+            if reset:
+                self._window = {}
+                if not window:
+                    self._stages = {}
+        for entry in stages.values():
+            entry['p50_seconds'] = _quantile(entry, 0.5)
+            entry['p99_seconds'] = _quantile(entry, 0.99)
+        return stages
+
+    def render_prometheus(self):
+        """Text exposition format for a /metrics scrape"""
+        lines = [
+            '# TYPE leadportal_stage_seconds histogram',
+            '# TYPE leadportal_stage_rows_total counter'
+        ]
+        for stage, entry in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, entry['buckets']):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'leadportal_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'leadportal_stage_seconds_sum{{stage="{stage}"}} {entry["total_seconds"]}')
+            lines.append(f'leadportal_stage_seconds_count{{stage="{stage}"}} {entry["calls"]}')
+            lines.append(f'leadportal_stage_rows_total{{stage="{stage}"}} {entry["rows"]}')
+        return '\n'.join(lines) + '\n'
+
+    def write_to(self, database):
+        """Append the current window to the stage_timings table and start a new one.
+
+        The totals served to /metrics scrapes keep counting across windows.
+        """
+        snapshot = self.snapshot(reset=True, window=True)
+        if snapshot:
+            database.log_stage_timings(snapshot)
+        return snapshot
+
+def _quantile(entry, q):
+    if not entry['calls']:
+        return None
+    target = q * entry['calls']
+    cumulative = 0
+    for bound, count in zip(BUCKETS, entry['buckets']):
+        cumulative += count
+        if cumulative >= target:
+            return min(bound, entry['max_seconds'])
+    return entry['max_seconds']
+
+# Process-wide registry used by the timed() hooks
+metrics = StageMetrics()
+
+def timed(stage, rows=None):
+    """Decorator recording each call's duration under stage.
+
+    rows, if given, maps the return value to the number of rows it covered
+    (e.g. len for a DataFrame); otherwise each call counts as one row.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            result = None
+            try:
+                result = func(*args, **kwargs)
+                return result
+            finally:
+                count = rows(result) if rows is not None and result is not None else 1
+                metrics.observe(stage, time.perf_counter() - started, count)
+        return wrapper
+    return decorator
+
+def serve_metrics(port=9108, registry=metrics):
+    """Serve registry at http://0.0.0.0:port/metrics from a background thread"""
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('0.0.0.0', port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,121 @@
+import logging
+import multiprocessing
+import time
+from collections import deque
+from itertools import groupby
+from operator import itemgetter
+from models.database import Database
+from models.metrics import metrics
+from models.webhook import WebhookSender, RetryableWebhookError
+
+logger = logging.getLogger(__name__)
+
+class OutboxWorker:
+    """Delivers leads from the lead_outbox table to Bonzo.
+
+    Any number of workers, in one process or across hosts, can run against
+    the same table: each claims its own batch with FOR UPDATE SKIP LOCKED,
+    and a batch left in flight by a crashed worker is picked up again once
+    its lease expires. The lease is renewed between sub-batches, and results
+    are only written back for rows still held under this worker's claim.
+    """
+
+    def __init__(self, database, sender, batch_size=200, concurrency=8,
+                 lease_seconds=300, max_attempts=5, renew_every=50):
+        self.db = database
+        self.sender = sender
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # Leads sent between lease renewals; keep it small enough to send
+        # within lease_seconds at the slowest rate the sender backs off to
+        self.renew_every = renew_every
+        # (sent_ids, failures, claimed_at) of batches whose results are not yet written back
+        self._held = deque()
+
+    def run_once(self):
+        """Claim and send one batch; returns the number of leads claimed.
+
+        Results are written back even when sending stops partway; if that
+        write fails too, they are kept and written before the next claim.
+        """
+        self._finish_held()
+        claimed = self.db.claim_leads(self.batch_size, self.lease_seconds, self.max_attempts)
+        if not claimed:
+            return 0
+        claimed_at = claimed[0][2]
+
+        sent_ids = []
+        failures = []
+        try:
+            for start in range(0, len(claimed), self.renew_every):
+                part = claimed[start:start + self.renew_every]
+                if start:
+                    # Renew the lease before each later sub-batch and drop rows
+                    # another worker reclaimed meanwhile, so they are not sent twice
+                    held = self.db.renew_leads([row[0] for row in part], claimed_at, self.lease_seconds)
+                    part = [row for row in part if row[0] in held]
+                # Send runs of leads from one source together, so responses are logged with it
+                for source_type, rows in groupby(part, key=itemgetter(3)):
+                    rows = list(rows)
+                    results = self.sender.send_many([row[1] for row in rows], self.concurrency, source_type)
+                    for row, result in zip(rows, results):
+                        if result is True:
+                            sent_ids.append(row[0])
+                        else:
+                            failures.append((row[0], str(result), isinstance(result, RetryableWebhookError)))
+        finally:
+            self._held.append((sent_ids, failures, claimed_at))
+            self._finish_held()
+        return len(claimed)
+
+    def _finish_held(self):
+        """Write back batch results not yet recorded, oldest first"""
+        while self._held:
+            sent_ids, failures, claimed_at = self._held[0]
+            if sent_ids or failures:
+                self.db.finish_leads(sent_ids, failures, self.max_attempts, claimed_at)
+            self._held.popleft()
+
+    def run(self, poll_interval=5.0, stop_when_empty=False, metrics_interval=60.0):
+        """Keep delivering batches, polling for new leads when the outbox is empty.
+
+        A batch that fails (e.g. the database is briefly unreachable) is
+        logged and retried after poll_interval instead of ending the worker.
+        Stage timings are written to stage_timings every metrics_interval
+        seconds, and once more when the outbox runs empty with stop_when_empty.
+        """
+        last_write = time.monotonic()
+        while True:
+            try:
+                if time.monotonic() - last_write >= metrics_interval:
+                    metrics.write_to(self.db)
+                    last_write = time.monotonic()
+                if self.run_once():
+                    continue
+                if stop_when_empty:
+                    metrics.write_to(self.db)
+                    return
+            except Exception:
+                logger.exception("Outbox batch failed; retrying in %s seconds", poll_interval)
+            time.sleep(poll_interval)
+
+def _worker_main(worker_options, run_options):
+    with Database(buffer_size=500) as db:
+        worker = OutboxWorker(db, WebhookSender(db), **worker_options)
+        worker.run(**run_options)
+
+def run_workers(processes=4, poll_interval=5.0, stop_when_empty=False, metrics_interval=60.0,
+                **worker_options):
+    """Run OutboxWorkers in separate processes, each with its own connection"""
+    run_options = {'poll_interval': poll_interval, 'stop_when_empty': stop_when_empty,
+                   'metrics_interval': metrics_interval}
+    workers = [
+        multiprocessing.Process(target=_worker_main, args=(worker_options, run_options))
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
@@ -0,0 +1,90 @@
+import random
+import threading
+import time
+import config
+
+class RateController:
+    """Token bucket whose refill rate adapts to webhook responses (AIMD).
+
+    Sending starts at rate (default: the max_rate cap), so nothing is held
+    back until the first 429, server error or slow response. Successful
+    sends under the target latency raise the rate additively; 429s, server
+    errors and slow responses cut it multiplicatively. A Retry-After from
+    the server pauses all senders until it expires. rate and max_rate
+    default to the WEBHOOK_START_RATE / WEBHOOK_MAX_RATE settings.
+    """
+
+    def __init__(self, rate=None, min_rate=0.5, max_rate=None, burst=None,
+                 increase=2.0, decrease=0.5, target_latency=2.0,
+                 cooldown=1.0, base_delay=0.5, max_delay=30.0):
+        max_rate = max_rate if max_rate is not None else config.WEBHOOK_MAX_RATE
+        rate = rate if rate is not None else (config.WEBHOOK_START_RATE or max_rate)
+        self.rate = rate
+        self.min_rate = min_rate
+        # An explicit starting rate above the cap raises the cap
+        self.max_rate = max(max_rate, rate)
+        # Without a fixed burst the bucket holds one second at the current rate
+        self.burst = burst
+        self.increase = increase
+        self.decrease = decrease
+        self.target_latency = target_latency
+        self.cooldown = cooldown
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._tokens = self._capacity()
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def _capacity(self):
+        return self.burst or max(1.0, self.rate)
+
+    def _refill(self, now):
+        self._tokens = min(self._capacity(), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Block until a send is allowed"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def on_success(self, latency):
+        """Record a successful send and its round-trip time in seconds"""
+        if latency > self.target_latency:
+            self._slow_down()
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            # Roughly +increase requests/second for every second at full rate
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def on_throttle(self, retry_after=None):
+        """Record a 429/5xx/timeout, honouring any Retry-After in seconds"""
+        self._slow_down()
+        if retry_after:
+            with self._lock:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def _slow_down(self):
+        with self._lock:
+            now = time.monotonic()
+            # Responses to requests already in flight report the same
+            # congestion; only cut the rate once per cooldown window
+            if now - self._last_decrease < self.cooldown:
+                return
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._last_decrease = now
+
+    def backoff(self, attempt, retry_after=None):
+        """Seconds to wait before retry number attempt (0-based), with full jitter"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, retry_after or 0)
@@ -0,0 +1,141 @@
+import os
+import uuid
+import config
+
+def _pyarrow():
+    """(pyarrow, pyarrow.parquet), or None when pyarrow is not installed"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow, pyarrow.parquet
+
+class StagingCache:
+    """Parquet copies of normalized files, keyed by source type and file hash.
+
+    Reprocessing, exports and drill-downs read the staged columns back with
+    memory-mapped Arrow reads instead of parsing the vendor CSV again. Once
+    the directory grows past max_bytes, the least recently used files are
+    evicted. Without pyarrow the cache is inert: nothing is staged and
+    every lookup misses.
+    """
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or config.STAGING_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else config.STAGING_MAX_BYTES
+
+    @property
+    def available(self):
+        return _pyarrow() is not None
+
+    def path(self, source_type, file_hash, variant=None):
+        """variant keeps differently typed stagings of one file apart, e.g. 'compact'"""
+        suffix = f'.{variant}' if variant else ''
+        return os.path.join(self.directory, source_type, f'{file_hash.hex()}{suffix}.parquet')
+
+    def _hit(self, source_type, file_hash, variant=None):
+        """Path of a staged file, marked as just used; None on a miss"""
+        path = self.path(source_type, file_hash, variant)
+        if not self.available or not os.path.exists(path):
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def load(self, source_type, file_hash, columns=None, variant=None):
+        """Staged DataFrame, optionally only some columns; None if not staged"""
+        path = self._hit(source_type, file_hash, variant)
+        if path is None:
+            return None
+        _, parquet = _pyarrow()
+        return parquet.read_table(path, columns=columns, memory_map=True).to_pandas()
+
+    def iter_batches(self, source_type, file_hash, batch_size, columns=None, variant=None):
+        """Generator of staged DataFrames of at most batch_size rows; None if not staged"""
+        path = self._hit(source_type, file_hash, variant)
+        if path is None:
+            return None
+        _, parquet = _pyarrow()
+        staged = parquet.ParquetFile(path, memory_map=True)
+        return (batch.to_pandas() for batch in staged.iter_batches(batch_size, columns=columns))
+
+    def stage(self, source_type, file_hash, chunks, chunksize, variant=None):
+        """Pass normalized chunks through, from the cache if staged or else staging them.
+
+        chunks is only consumed on a miss. The file is published once every
+        chunk has gone through; a partly consumed or failed write is dropped.
+        """
+        cached = self.iter_batches(source_type, file_hash, chunksize, variant=variant)
+        if cached is not None:
+            yield from cached
+            return
+        if not self.available:
+            yield from chunks
+            return
+
+        pyarrow, parquet = _pyarrow()
+        path = self.path(source_type, file_hash, variant)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = f'{path}.{uuid.uuid4().hex}.tmp'
+        writer = None
+        complete = False
+        try:
+            for normalized in chunks:
+                try:
+                    table = pyarrow.Table.from_pandas(normalized, preserve_index=True)
+                    if writer is None:
+                        writer = parquet.ParquetWriter(partial, table.schema)
+                    elif table.schema != writer.schema:
+                        table = table.cast(writer.schema)
+                    writer.write_table(table)
+                except (pyarrow.ArrowException, ValueError, TypeError):
+                    # Columns whose types drift between chunks cannot be
+                    # staged; keep ingesting without the cache
+                    if writer is not None:
+                        writer.close()
+                    yield normalized
+                    yield from chunks
+                    return
+                yield normalized
+            complete = writer is not None
+        finally:
+            if writer is not None and writer.is_open:
+                writer.close()
+            if complete:
+                os.replace(partial, path)
+                self.evict()
+            elif os.path.exists(partial):
+                os.remove(partial)
+
+    def store(self, source_type, file_hash, normalized, variant=None):
+        """Stage a whole normalized DataFrame at once"""
+        for _ in self.stage(source_type, file_hash, [normalized], len(normalized) or 1, variant):
+            pass
+
+    def evict(self):
+        """Delete least recently used staged files until the cache fits in max_bytes"""
+        staged = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.parquet'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    staged.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in staged)
+        removed = []
+        for _, size, path in sorted(staged):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed.append(path)
+        return removed
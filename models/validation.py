@@ -0,0 +1,75 @@
+import pandas as pd
+
+PHONE_FIELDS = ['phone', 'phone2', 'phone3']
+
+# (field, low, high) bounds for numeric fields; 0 means "not provided" after
+# normalize_data and is always accepted
+NUMERIC_RANGES = [
+    ('credit_score', 300, 850),
+    ('mortgage_rate', 0, 25),
+    ('second_rate', 0, 25),
+    ('ltv', 0, 200)
+]
+
+class LeadValidator:
+    """Checks normalized leads against the processing rules column by column.
+
+    Rows that fail any rule are split off with a semicolon-separated list of
+    reason codes and, when a database is given, written to rejected_leads in
+    one bulk insert per batch.
+    """
+
+    def __init__(self, database=None):
+        self.db = database
+
+    def reasons(self, normalized):
+        """Series of reason codes per row; empty string for valid rows"""
+        index = normalized.index
+        blank = pd.Series('', index=index)
+
+        def column(field):
+            if field in normalized:
+                return normalized[field].fillna('').astype(str).str.strip()
+            return blank
+
+        phones = {field: column(field) for field in PHONE_FIELDS}
+        has_phone = pd.concat([phone != '' for phone in phones.values()], axis=1).any(axis=1)
+        checks = [('missing_contact', (column('email') == '') & ~has_phone)]
+
+        for field, phone in phones.items():
+            checks.append((f'invalid_{field}', (phone != '') & ~phone.str.fullmatch(r'\d{10}').fillna(False).astype(bool)))
+
+        zip_code = column('zip')
+        checks.append(('invalid_zip', (zip_code != '') & ~zip_code.str.fullmatch(r'\d{5}').fillna(False).astype(bool)))
+
+        for field, low, high in NUMERIC_RANGES:
+            if field in normalized:
+                value = pd.to_numeric(normalized[field], errors='coerce').fillna(0)
+                checks.append((f'{field}_out_of_range', (value != 0) & ((value < low) | (value > high))))
+
+        reasons = blank
+        for code, failed in checks:
+            reasons = reasons.where(~failed, reasons + code + ';')
+        return reasons.str.rstrip(';')
+
+    def validate(self, normalized, source_type=None, file_name=None):
+        """Split a normalized frame into (valid, rejected).
+
+        rejected carries a reject_reasons column and is also written to the
+        database if one was given.
+        """
+        reasons = self.reasons(normalized)
+        failed = reasons != ''
+        valid = normalized[~failed]
+        rejected = normalized[failed].assign(reject_reasons=reasons[failed])
+        if self.db is not None and not rejected.empty:
+            self.write_rejects(rejected, source_type, file_name)
+        return valid, rejected
+
+    def write_rejects(self, rejected, source_type=None, file_name=None):
+        lead_ids = rejected['lead_id'].astype(str).tolist() if 'lead_id' in rejected else [None] * len(rejected)
+        leads = rejected.drop(columns='reject_reasons').to_json(orient='records', lines=True).splitlines()
+        self.db.log_rejected_leads(
+            source_type, file_name,
+            zip(lead_ids, rejected['reject_reasons'].tolist(), leads)
+        )
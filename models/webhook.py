@@ -1,15 +1,95 @@
 import requests
 import json
-from config import BONZO_WEBHOOK_URL
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+import config
+from models.rate_control import RateController
+from models.metrics import metrics, timed
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Number of keep-alive connections held open to the webhook host
+DEFAULT_POOL_SIZE = 16
+
+# Retries after the first attempt for timeouts, 429s and server errors
+DEFAULT_MAX_RETRIES = 3
+
+# Normalized lead fields read when building a payload
+LEAD_FIELDS = [
+    'first_name', 'last_name', 'email', 'phone', 'phone2', 'phone3',
+    'address', 'city', 'state', 'zip', 'property_value', 'property_description',
+    'property_purpose', 'credit_score', 'mortgage_balance', 'mortgage_rate',
+    'second_mortgage', 'second_balance', 'second_rate', 'additional_cash',
+    'cash_out', 'loan_purpose', 'found_home', 'down_payment', 'ltv',
+    'bid_loan_value', 'va_eligible', 'lead_source', 'lead_id'
+]
 
 class WebhookError(Exception):
     """Custom exception for webhook-related errors"""
     pass
 
+class RetryableWebhookError(WebhookError):
+    """Webhook error that may succeed if the lead is sent again"""
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def encode_payload(payload):
+    """Encode a payload to JSON bytes, with orjson when it is installed"""
+    try:
+        if orjson is not None:
+            return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+        return json.dumps(payload).encode('utf-8')
+    except (TypeError, ValueError) as e:
+        raise WebhookError(f"Error preparing payload: {str(e)}")
+
+def _column_values(series):
+    """A column's values as a list, with missing values (NaN, pd.NA) as None"""
+    if series.hasnans:
+        series = series.astype(object).where(series.notna(), None)
+    return series.tolist()
+
+def _retry_after(response):
+    """Seconds requested by a Retry-After header, or None"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
 class WebhookSender:
-    def __init__(self, database):
+    def __init__(self, database, pool_size=DEFAULT_POOL_SIZE, rate_controller=None,
+                 max_retries=DEFAULT_MAX_RETRIES, webhook_url=None):
         self.db = database
+        self.rate_controller = rate_controller or RateController()
+        self.max_retries = max_retries
+        self.webhook_url = webhook_url or config.BONZO_WEBHOOK_URL
+        # Shared session so every send reuses pooled keep-alive connections
+        self.session = requests.Session()
+        self._mount_pool(pool_size)
+
+    def _mount_pool(self, pool_size):
+        """(Re)mount the session's adapter with room for pool_size keep-alive connections"""
+        self.pool_size = pool_size
+        # pool_block makes a request wait for a free connection rather than
+        # open one that is thrown away afterwards
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
 
+    @timed('webhook.prepare_payload')
     def prepare_payload(self, lead_data):
         """Convert normalized lead data to Bonzo webhook format"""
         try:
@@ -29,59 +109,120 @@ class WebhookSender:
             if not lead_data.get('email') and not primary_phone:
                 raise WebhookError("Either email or phone is required")
             
-            return {
-                "contact": {
-                    "first_name": lead_data.get('first_name'),
-                    "last_name": lead_data.get('last_name'),
-                    "email": lead_data.get('email'),
-                    "primary_phone": primary_phone,
-                    "alt_phone_1": alt_phones[0] if len(alt_phones) > 0 else None,
-                    "alt_phone_2": alt_phones[1] if len(alt_phones) > 1 else None
-                },
-                "property": {
-                    "street_address": lead_data.get('address'),
-                    "city": lead_data.get('city'),
-                    "state": lead_data.get('state'),
-                    "zip": lead_data.get('zip'),
-                    "value": lead_data.get('property_value'),
-                    "description": lead_data.get('property_description'),
-                    "purpose": lead_data.get('property_purpose')
-                },
-                "loan": {
-                    "credit_score": lead_data.get('credit_score'),
-                    "current_balance": lead_data.get('mortgage_balance'),
-                    "current_rate": lead_data.get('mortgage_rate'),
-                    "second_mortgage": lead_data.get('second_mortgage'),
-                    "second_balance": lead_data.get('second_balance'),
-                    "second_rate": lead_data.get('second_rate'),
-                    "additional_cash": lead_data.get('additional_cash'),
-                    "cash_out": lead_data.get('cash_out'),
-                    "loan_purpose": lead_data.get('loan_purpose'),
-                    "found_home": lead_data.get('found_home'),
-                    "down_payment": lead_data.get('down_payment'),
-                    "ltv": lead_data.get('ltv'),
-                    "bid_loan_value": lead_data.get('bid_loan_value'),
-                    "va_eligible": lead_data.get('va_eligible')
-                },
-                "lead": {
-                    "source": lead_data.get('lead_source'),
-                    "original_id": lead_data.get('lead_id')
-                }
-            }
+            return self._build_payload(lead_data, primary_phone, alt_phones)
         except Exception as e:
             raise WebhookError(f"Error preparing payload: {str(e)}")
 
-    def send(self, lead_data):
-        """Send lead data to Bonzo webhook"""
+    def _build_payload(self, lead_data, primary_phone, alt_phones):
+        return {
+            "contact": {
+                "first_name": lead_data.get('first_name'),
+                "last_name": lead_data.get('last_name'),
+                "email": lead_data.get('email'),
+                "primary_phone": primary_phone,
+                "alt_phone_1": alt_phones[0] if len(alt_phones) > 0 else None,
+                "alt_phone_2": alt_phones[1] if len(alt_phones) > 1 else None
+            },
+            "property": {
+                "street_address": lead_data.get('address'),
+                "city": lead_data.get('city'),
+                "state": lead_data.get('state'),
+                "zip": lead_data.get('zip'),
+                "value": lead_data.get('property_value'),
+                "description": lead_data.get('property_description'),
+                "purpose": lead_data.get('property_purpose')
+            },
+            "loan": {
+                "credit_score": lead_data.get('credit_score'),
+                "current_balance": lead_data.get('mortgage_balance'),
+                "current_rate": lead_data.get('mortgage_rate'),
+                "second_mortgage": lead_data.get('second_mortgage'),
+                "second_balance": lead_data.get('second_balance'),
+                "second_rate": lead_data.get('second_rate'),
+                "additional_cash": lead_data.get('additional_cash'),
+                "cash_out": lead_data.get('cash_out'),
+                "loan_purpose": lead_data.get('loan_purpose'),
+                "found_home": lead_data.get('found_home'),
+                "down_payment": lead_data.get('down_payment'),
+                "ltv": lead_data.get('ltv'),
+                "bid_loan_value": lead_data.get('bid_loan_value'),
+                "va_eligible": lead_data.get('va_eligible')
+            },
+            "lead": {
+                "source": lead_data.get('lead_source'),
+                "original_id": lead_data.get('lead_id')
+            }
+        }
+
+    @timed('webhook.prepare_payloads', rows=len)
+    def prepare_payloads(self, normalized):
+        """Build and encode the payload for every row of a normalized DataFrame.
+
+        Columns are pulled out once and zipped instead of calling .get per
+        field per lead. Returns (lead_id, body) pairs in row order, where
+        body is the encoded JSON bytes, or the WebhookError for a row
+        without an email or phone.
+        """
+        count = len(normalized)
+        columns = {
+            field: _column_values(normalized[field]) if field in normalized else [None] * count
+            for field in LEAD_FIELDS
+        }
+        results = []
+        for values in zip(*(columns[field] for field in LEAD_FIELDS)):
+            lead = dict(zip(LEAD_FIELDS, values))
+            phones = (lead['phone'], lead['phone2'], lead['phone3'])
+            primary_phone = phones[0]
+            if not primary_phone:
+                primary_phone = phones[1] or phones[2]
+            if not lead['email'] and not primary_phone:
+                results.append((lead['lead_id'], WebhookError(
+                    "Error preparing payload: Either email or phone is required")))
+                continue
+            alt_phones = [phone for phone in phones if phone and phone != primary_phone]
+            try:
+                body = encode_payload(self._build_payload(lead, primary_phone, alt_phones))
+            except WebhookError as e:
+                body = e
+            results.append((lead['lead_id'], body))
+        return results
+
+    def send(self, lead_data, source_type=None):
+        """Send lead data to Bonzo webhook, retrying timeouts, 429s and 5xx with backoff"""
+        body = encode_payload(self.prepare_payload(lead_data))
+        return self.send_encoded(lead_data.get('lead_id'), body, source_type)
+
+    @timed('webhook.send')
+    def send_encoded(self, lead_id, body, source_type=None):
+        """Send an already encoded payload, retrying timeouts, 429s and 5xx with backoff.
+
+        source_type is logged with each response for the per-source rollups.
+        """
+        attempt = 0
+        while True:
+            try:
+                return self._send_once(lead_id, body, source_type)
+            except RetryableWebhookError as e:
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(self.rate_controller.backoff(attempt, e.retry_after))
+                attempt += 1
+
+    def _send_once(self, lead_id, body, source_type=None):
+        # The bytes sent to Bonzo are also what gets logged to the JSONB column
+        payload_json = body.decode('utf-8')
         try:
-            payload = self.prepare_payload(lead_data)
-            
-            response = requests.post(
-                BONZO_WEBHOOK_URL,
-                json=payload,
-                headers={'Content-Type': 'application/json'},
-                timeout=10
-            )
+            with metrics.time('webhook.rate_wait'):
+                self.rate_controller.acquire()
+            started = time.monotonic()
+            with metrics.time('webhook.http'):
+                response = self.session.post(
+                    self.webhook_url,
+                    data=body,
+                    headers={'Content-Type': 'application/json'},
+                    timeout=10
+                )
+            latency = time.monotonic() - started
             
             # Check for specific HTTP error codes
             if response.status_code == 400:
@@ -100,12 +241,23 @@ class WebhookSender:
                 error_msg = response.text
             
             self.db.log_webhook_response(
-                lead_data.get('lead_id'),
-                json.dumps(payload),
+                lead_id,
+                payload_json,
                 response.status_code,
-                error_msg if response.status_code != 200 else response.text
+                error_msg if response.status_code != 200 else response.text,
+                source_type
             )
             
+            if response.status_code == 429 or response.status_code >= 500:
+                retry_after = _retry_after(response)
+                self.rate_controller.on_throttle(retry_after)
+                raise RetryableWebhookError(f"HTTP {response.status_code}: {error_msg}", retry_after)
+            
+            self.rate_controller.on_success(latency)
+            
+            if response.status_code == 408:
+                raise RetryableWebhookError(f"HTTP {response.status_code}: {error_msg}")
+            
             if response.status_code != 200:
                 raise WebhookError(f"HTTP {response.status_code}: {error_msg}")
             
@@ -114,22 +266,26 @@ class WebhookSender:
         except requests.Timeout:
             error_msg = "Request timed out after 10 seconds"
             self.db.log_webhook_response(
-                lead_data.get('lead_id'),
-                json.dumps(payload),
+                lead_id,
+                payload_json,
                 408,
-                error_msg
+                error_msg,
+                source_type
             )
-            raise WebhookError(error_msg)
+            self.rate_controller.on_throttle()
+            raise RetryableWebhookError(error_msg)
             
         except requests.ConnectionError:
             error_msg = "Failed to connect to Bonzo server"
             self.db.log_webhook_response(
-                lead_data.get('lead_id'),
-                json.dumps(payload),
+                lead_id,
+                payload_json,
                 503,
-                error_msg
+                error_msg,
+                source_type
             )
-            raise WebhookError(error_msg)
+            self.rate_controller.on_throttle()
+            raise RetryableWebhookError(error_msg)
             
         except WebhookError:
             raise
@@ -137,9 +293,58 @@ class WebhookSender:
         except Exception as e:
             error_msg = f"Unexpected error: {str(e)}"
             self.db.log_webhook_response(
-                lead_data.get('lead_id'),
-                json.dumps(payload) if 'payload' in locals() else "",
+                lead_id,
+                payload_json,
                 500,
-                error_msg
+                error_msg,
+                source_type
             )
             raise WebhookError(error_msg)
+
+    def send_many(self, leads, concurrency=8, source_type=None):
+        """Send leads concurrently over the pooled session.
+
+        At most `concurrency` requests are in flight at once. Returns one
+        result per lead in input order: True on success, or the WebhookError
+        raised for that lead.
+        """
+        return self._dispatch(self.send, ((lead_data, source_type) for lead_data in leads), concurrency)
+
+    def send_frame(self, normalized, concurrency=8, source_type=None):
+        """Send every row of a normalized DataFrame concurrently.
+
+        Payloads are built with prepare_payloads, so each lead is encoded
+        once. Returns one result per row in order, as send_many does.
+        """
+        prepared = self.prepare_payloads(normalized)
+        sendable = [(lead_id, body, source_type) for lead_id, body in prepared
+                    if not isinstance(body, WebhookError)]
+        sent = iter(self._dispatch(self.send_encoded, sendable, concurrency))
+        return [body if isinstance(body, WebhookError) else next(sent) for _, body in prepared]
+
+    def _dispatch(self, send, calls, concurrency):
+        """Run send(*args) for each args tuple with at most concurrency in flight"""
+        if concurrency > self.pool_size:
+            self._mount_pool(concurrency)
+        results = []
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                pending = deque()
+                for args in calls:
+                    if len(pending) >= concurrency:
+                        results.append(self._result(pending.popleft()))
+                    pending.append(executor.submit(send, *args))
+                while pending:
+                    results.append(self._result(pending.popleft()))
+        finally:
+            self.db.flush()
+        return results
+
+    def _result(self, future):
+        """A lead's result; any exception, e.g. from logging its response, fails only that lead"""
+        try:
+            return future.result()
+        except WebhookError as e:
+            return e
+        except Exception as e:
+            return WebhookError(f"Unexpected error: {str(e)}")
@@ -0,0 +1,35 @@
+"""Row fingerprints must not depend on the dtypes a frame was normalized into."""
+import pytest
+from benchmarks.synthetic import generate
+from models.fingerprint import IngestFingerprints
+from models.lead_processor import LeadProcessor
+
+@pytest.mark.parametrize('source_type', ['experian', 'transunion', 'leadsource'])
+def test_compact_rows_hash_like_default_rows(tmp_path, source_type):
+    rows = generate(source_type, 300)
+    # Blank every seventh numeric cell, so default mode reads those columns as float64
+    for column in rows.select_dtypes('number').columns:
+        rows[column] = rows[column].astype(object)
+        rows.iloc[::7, rows.columns.get_loc(column)] = ''
+    path = str(tmp_path / f'{source_type}.csv')
+    rows.to_csv(path, index=False)
+    default = LeadProcessor().normalize_file(path, source_type)
+    compact = LeadProcessor(compact=True).normalize_file(path, source_type)
+    fingerprints = IngestFingerprints(None)
+
+    assert (fingerprints.row_hashes(compact) == fingerprints.row_hashes(default)).all()
+
+def test_rows_hash_alike_in_chunks_with_and_without_blank_numbers(tmp_path):
+    rows = generate('transunion', 4)
+    rows.iloc[:2].to_csv(tmp_path / 'alone.csv', index=False)
+    # The same two rows, then one with a blank score
+    rows['FICO04 Score'] = rows['FICO04 Score'].astype(object)
+    rows.loc[3, 'FICO04 Score'] = ''
+    rows.to_csv(tmp_path / 'overlap.csv', index=False)
+    processor = LeadProcessor()
+    fingerprints = IngestFingerprints(None)
+
+    alone = processor.normalize_file(str(tmp_path / 'alone.csv'), 'transunion')
+    overlap = processor.normalize_file(str(tmp_path / 'overlap.csv'), 'transunion')
+    assert alone['credit_score'].dtype != overlap['credit_score'].dtype
+    assert (fingerprints.row_hashes(overlap)[:2] == fingerprints.row_hashes(alone)).all()
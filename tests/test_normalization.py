@@ -0,0 +1,75 @@
+"""Column-wise normalization must match the per-value functions it replaced."""
+import random
+import numpy as np
+import pandas as pd
+import pytest
+from models.lead_processor import LeadProcessor
+from utils.experian_parser import ExperianParser
+
+# Raw cell values seen in vendor files, plus edge cases around them
+VALUES = [
+    np.nan, None, '', '   ',
+    '0000000000', '000-000-0000', 0, 0.0, 10000000000,
+    '5551234567', '+1 (555) 123-4567', '555.123.4567 x12', '  555-000-0000 ', '12345', 'abc',
+    5551234567, 5551234567.0, 15551234567, 2.5, 1, -1,
+    True, False,
+    'Yes', 'no', 'T', 'f', '1', '0', '2', 'TRUE', 'y ', ' y', '1.0'
+]
+
+# Homogeneous columns, to cover the non-object dtypes pandas infers
+TYPED_COLUMNS = [
+    [True, False, True],
+    [1, 0, 3],
+    [1.5, np.nan, 0.0],
+    [5551234567.0, np.nan, 0.0],
+    [5551234567, 15551234567, 0],
+    ['a', 'Yes', ''],
+    [True, np.nan],
+    [1, np.nan],
+    [np.nan, np.nan],
+    []
+]
+
+@pytest.fixture(scope='module')
+def processor():
+    return LeadProcessor()
+
+@pytest.fixture(scope='module')
+def experian():
+    return ExperianParser()
+
+def _columns():
+    rng = random.Random(0)
+    columns = [pd.Series(values) for values in TYPED_COLUMNS]
+    columns.append(pd.Series(VALUES, dtype=object))
+    columns.extend(pd.Series(rng.sample(VALUES, rng.randint(1, 8)), dtype=object) for _ in range(500))
+    return columns
+
+COLUMNS = _columns()
+
+def _assert_matches(scalar, column, series):
+    expected = [scalar(value) for value in series]
+    assert column(series).tolist() == expected, series.tolist()
+
+@pytest.mark.parametrize('series', COLUMNS)
+def test_format_phone_column(processor, series):
+    _assert_matches(processor._format_phone, processor._format_phone_column, series)
+
+@pytest.mark.parametrize('series', COLUMNS)
+def test_convert_to_boolean_column(processor, series):
+    _assert_matches(processor._convert_to_boolean, processor._convert_to_boolean_column, series)
+
+@pytest.mark.parametrize('series', COLUMNS)
+def test_convert_to_boolean_column_after_fillna(processor, series):
+    # normalize_data blanks missing values before converting
+    _assert_matches(processor._convert_to_boolean, processor._convert_to_boolean_column, series.fillna(''))
+
+@pytest.mark.parametrize('series', COLUMNS)
+def test_clean_phone_column(experian, series):
+    _assert_matches(experian.clean_phone, experian.clean_phone_column, series)
+
+def test_index_is_kept(processor, experian):
+    series = pd.Series(['5551234567', None, 'yes'], index=[10, 20, 30])
+    assert processor._format_phone_column(series).index.tolist() == [10, 20, 30]
+    assert processor._convert_to_boolean_column(series).index.tolist() == [10, 20, 30]
+    assert experian.clean_phone_column(series).index.tolist() == [10, 20, 30]
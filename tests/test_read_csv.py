@@ -0,0 +1,24 @@
+"""The pyarrow CSV path must parse vendor files the same as the default reader."""
+import pandas as pd
+import pytest
+from benchmarks.synthetic import write_csv
+from models.lead_processor import LeadProcessor
+
+pytest.importorskip('pyarrow')
+
+@pytest.mark.parametrize('source_type', ['experian', 'transunion', 'leadsource'])
+def test_pyarrow_engine_matches_default(tmp_path, source_type):
+    path = write_csv(source_type, 300, str(tmp_path / f'{source_type}.csv'))
+    processor = LeadProcessor()
+    expected = processor.process_file(path, source_type)
+    parsed = processor.process_file(path, source_type, engine='pyarrow')
+
+    assert list(parsed.columns) == list(expected.columns)
+    pd.testing.assert_frame_equal(processor.normalize_data(parsed), processor.normalize_data(expected),
+                                  check_dtype=False)
+
+def test_pyarrow_engine_reads_zips_as_text(tmp_path):
+    path = write_csv('experian', 2000, str(tmp_path / 'experian.csv'))
+    parsed = LeadProcessor().process_file(path, 'experian', engine='pyarrow')
+
+    assert parsed['Zipcode'].str.len().eq(5).all()
@@ -1,6 +1,24 @@
+import logging
 import pandas as pd
 
+logger = logging.getLogger(__name__)
+
 class ExperianParser:
+    # Handle phone numbers - check both original and duplicate columns
+    phone_mappings = [
+        ('Telephone # 1.1', 'Phone_Number'),  # Try the duplicate column first
+        ('Telephone # 1', 'Phone_Number'),    # Then the original
+        ('Telephone # 2.1', 'Phone_Number_2'),
+        ('Telephone # 2', 'Phone_Number_2'),
+        ('Telephone # 3.1', 'Phone_Number_3'),
+        ('Telephone # 3', 'Phone_Number_3')
+    ]
+
+    def __init__(self, diagnostics=False):
+        # When enabled, parse() stores a phone_coverage() report in phone_report
+        self.diagnostics = diagnostics
+        self.phone_report = None
+
     def clean_phone(self, phone):
         if pd.isna(phone) or phone == '':
             return ''
@@ -9,6 +27,30 @@ class ExperianParser:
         # Keep only last 10 digits if longer
         return clean[-10:] if len(clean) >= 10 else ''
 
+    def clean_phone_column(self, series):
+        """Column-wise equivalent of clean_phone"""
+        clean = series.astype(str).str.replace(r'\D', '', regex=True)
+        valid = series.notna() & (clean.str.len() >= 10)
+        return clean.str[-10:].where(valid, '')
+
+    def phone_coverage(self, df):
+        """Report how many rows hold a valid phone number in each source column.
+
+        Returns a dict with the number of rows checked, the valid count per
+        phone column, and the raw phone values of rows with no valid number.
+        """
+        columns = [source for source, _ in self.phone_mappings if source in df.columns]
+        valid = pd.DataFrame(
+            {column: self.clean_phone_column(df[column]) != '' for column in columns},
+            index=df.index
+        )
+        missing = ~valid.any(axis=1)
+        return {
+            'total_rows': len(df),
+            'valid_counts': valid.sum().to_dict(),
+            'missing_rows': df.loc[missing, columns]
+        }
+
     def parse(self, df):
         # Clean up column names and handle duplicates
         df.columns = df.columns.str.strip()
@@ -35,41 +77,15 @@ class ExperianParser:
             if orig_col in df.columns:
                 parsed_df[new_col] = df[orig_col]
         
-        # Handle phone numbers - check both original and duplicate columns
-        phone_mappings = [
-            ('Telephone # 1.1', 'Phone_Number'),  # Try the duplicate column first
-            ('Telephone # 1', 'Phone_Number'),    # Then the original
-            ('Telephone # 2.1', 'Phone_Number_2'),
-            ('Telephone # 2', 'Phone_Number_2'),
-            ('Telephone # 3.1', 'Phone_Number_3'),
-            ('Telephone # 3', 'Phone_Number_3')
-        ]
-        
-        # Add debug logging for phone numbers
-        for index, row in df.iterrows():
-            found_phone = False
-            print(f"\nChecking phone numbers for record {index + 1}:")
-            
-            for source_field, target_field in phone_mappings:
-                if source_field in df.columns:
-                    phone_value = self.clean_phone(row[source_field])
-                    if phone_value:
-                        found_phone = True
-                        print(f"  Found valid phone {phone_value} in {source_field}")
-            
-            if not found_phone:
-                print(f"  WARNING: No valid phone numbers found for record {index + 1}")
-                print(f"  Raw phone values:")
-                for source_field, _ in phone_mappings:
-                    if source_field in df.columns:
-                        print(f"    {source_field}: {row[source_field]}")
+        if self.diagnostics:
+            self.phone_report = self.phone_coverage(df)
 
         # Process phone numbers for the DataFrame
-        for source_field, target_field in phone_mappings:
+        for source_field, target_field in self.phone_mappings:
             if source_field in df.columns and target_field not in parsed_df:
-                phone_values = df[source_field].apply(self.clean_phone)
+                phone_values = self.clean_phone_column(df[source_field])
                 if phone_values.any():  # Only set if we found any valid numbers
                     parsed_df[target_field] = phone_values
-                    print(f"Added phone numbers from {source_field} to {target_field}")
+                    logger.debug("Added phone numbers from %s to %s", source_field, target_field)
         
         return parsed_df
@@ -0,0 +1,114 @@
+from utils.experian_parser import ExperianParser
+from utils.transunion_parser import TransUnionParser
+from utils.leadsource_parser import LeadSourceParser
+
+class SourceSchema:
+    """The vendor columns a source parser reads, and the dtype to read each as.
+
+    Column names are matched after stripping whitespace, the same way the
+    parsers clean them. A dtype of None leaves the type to pandas, which
+    suits numeric fields that normalize_data coerces anyway.
+    """
+
+    def __init__(self, parser_class, columns):
+        self.parser_class = parser_class
+        self.columns = columns
+
+    def read_options(self, header, by_name=False):
+        """pd.read_csv usecols/dtype arguments for a file with this header.
+
+        Columns are selected by position so duplicated vendor headers
+        (e.g. Experian's repeated 'Telephone # 1') keep pandas' .1 names.
+        With by_name, they are selected and typed by the names in header
+        instead, for readers that take neither positions nor duplicates;
+        header should then be the .1-mangled names pandas reads.
+        """
+        usecols = []
+        dtype = {}
+        for position, name in enumerate(header):
+            key = name if by_name else position
+            name = str(name).strip()
+            if name in self.columns:
+                usecols.append(key)
+                if self.columns[name] is not None:
+                    dtype[key] = self.columns[name]
+        return usecols, dtype
+
+SOURCE_SCHEMAS = {}
+
+def register_schema(source_type, parser_class, columns):
+    """Register (or replace) the parser and column schema for a source type"""
+    SOURCE_SCHEMAS[source_type] = SourceSchema(parser_class, columns)
+
+def get_schema(source_type):
+    try:
+        return SOURCE_SCHEMAS[source_type]
+    except KeyError:
+        raise ValueError(f"Unknown source type: {source_type}")
+
+register_schema('experian', ExperianParser, {
+    'Primary Street ID (House number)': str,
+    'Street Name/Apartment': str,
+    'First Name': str,
+    'Surname': str,
+    'City': str,
+    'State': str,
+    'Zip Code': str,
+    'FICO_V30A_PSCRN_SCORE_VALUE': None,
+    'Total balance on open first mortgage trades reported in the last 3 months': None,
+    'Estimated interest rate on open with balance first mortgage loans with the largest current balance reported in the last 6 months': None,
+    'Telephone # 1': str,
+    'Telephone # 1.1': str,
+    'Telephone # 2': str,
+    'Telephone # 2.1': str,
+    'Telephone # 3': str,
+    'Telephone # 3.1': str
+})
+
+register_schema('transunion', TransUnionParser, {
+    'First_Name': str,
+    'Last_Name': str,
+    'Address': str,
+    'City': str,
+    'State': str,
+    'Zipcode': str,
+    'Phone_Number': str,
+    'FICO04 Score': None,
+    'Current Balance of Most Recent Mortgage': None,
+    'Monthly Payment Amount of Most Recent Mortgage': None,
+    'Open Date of Most Recent Mortgage': str,
+    'Perm_ID': str,
+    'Trigger_Date': str
+})
+
+register_schema('leadsource', LeadSourceParser, {
+    'First Name': str,
+    'Last Name': str,
+    'Address': str,
+    'City': str,
+    'State': str,
+    'ZIP': str,
+    'Pri. Phone': str,
+    'Sec. Phone': str,
+    'Lead ID': str,
+    'Lead Type': str,
+    'Email': str,
+    'Est. Home Value': None,
+    'Credit Grade': None,
+    'ADD_CASH': None,
+    'Cash Out': None,
+    'Loan Type': str,
+    'Loan Purpose': str,
+    'Prop. Desc': str,
+    'BAL_ONE': None,
+    'MTG_ONE_INT': None,
+    'MTG_TWO': None,
+    'BAL_TWO': None,
+    'MTG_TWO_INT': None,
+    'Found Home': None,
+    'DOWN_PMT': None,
+    'Property Purpose': str,
+    'LTV': None,
+    'bid_loan_val': None,
+    'VA Eligible': None
+})